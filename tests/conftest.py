@@ -1,4 +1,8 @@
 import os
+import shutil
+import tempfile
+
+import pytest
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 root_dir_content = os.listdir(BASE_DIR)
@@ -27,6 +31,8 @@ from django.utils.version import get_version
 
 assert get_version() < '3.0.0', 'Пожалуйста, используйте версию Django < 3.0.0'
 
+from django.test import override_settings
+
 from yatube.settings import INSTALLED_APPS
 
 assert any(app in INSTALLED_APPS for app in ['posts.apps.PostsConfig', 'posts']), (
@@ -37,3 +43,12 @@ pytest_plugins = [
     'tests.fixtures.fixture_user',
     'tests.fixtures.fixture_data',
 ]
+
+
+@pytest.fixture(autouse=True, scope='session')
+def isolated_settings():
+    """Загрузки - во временную папку, фоновые задачи - без пула потоков."""
+    media_root = tempfile.mkdtemp()
+    with override_settings(MEDIA_ROOT=media_root, BACKGROUND_WORKERS=0):
+        yield
+    shutil.rmtree(media_root, ignore_errors=True)
@@ -0,0 +1,108 @@
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, User
+from yatube.settings import AMT_POSTS
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        Post.objects.bulk_create(
+            Post(author=cls.author, group=cls.group, text=f'Пост {index}')
+            for index in range(AMT_POSTS + 3)
+        )
+        cls.post = Post.objects.latest('pub_date', 'id')
+        Comment.objects.create(post=cls.post, author=cls.reader,
+                               text='Первый')
+        Comment.objects.create(post=cls.post, author=cls.reader,
+                               text='Второй')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cursor_paging(self):
+        """Лента отдаётся страницами по курсору без пропусков."""
+        url = reverse('api:v1:posts')
+        first = self.client.get(url).json()
+        self.assertEqual(len(first['results']), AMT_POSTS)
+        self.assertIsNone(first['previous_cursor'])
+        second = self.client.get(url, {'cursor': first['next_cursor']}).json()
+        ids = [item['id'] for item in first['results'] + second['results']]
+        self.assertEqual(
+            ids, list(Post.objects.order_by('-pub_date', '-id')
+                      .values_list('id', flat=True))
+        )
+
+    def test_sparse_fields(self):
+        """?fields= оставляет в ответе только нужные поля."""
+        response = self.client.get(
+            reverse('api:v1:group_posts', args=[self.group.slug]),
+            {'fields': 'id,author'},
+        )
+        self.assertEqual(response.json()['results'][0],
+                         {'id': self.post.pk, 'author': 'author'})
+        response = self.client.get(reverse('api:v1:posts'),
+                                   {'fields': 'id,password'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_etag(self):
+        """Повторный запрос с ETag получает 304."""
+        url = reverse('api:v1:post_detail', args=[self.post.pk])
+        response = self.client.get(url)
+        self.assertEqual(response.json()['text'], self.post.text)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_follow_requires_login(self):
+        """Лента подписок доступна только авторизованному."""
+        url = reverse('api:v1:follow_posts')
+        self.assertEqual(self.client.get(url).status_code, 401)
+        self.client.force_login(self.reader)
+        results = self.client.get(url).json()['results']
+        self.assertEqual(results[0]['id'], self.post.pk)
+
+    def test_comments_oldest_first(self):
+        """Комментарии идут от старых к новым."""
+        response = self.client.get(
+            reverse('api:v1:post_comments', args=[self.post.pk]),
+            {'fields': 'text'},
+        )
+        self.assertEqual(response.json()['results'],
+                         [{'text': 'Первый'}, {'text': 'Второй'}])
+
+    def test_missing_objects(self):
+        """Несуществующие объекты дают 404 в JSON."""
+        for url in (reverse('api:v1:post_detail', args=[0]),
+                    reverse('api:v1:group_posts', args=['missing']),
+                    reverse('api:v1:profile_posts', args=['missing'])):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 404)
+                self.assertIn('detail', response.json())
+
+    def test_ingest(self):
+        """Загрузка NDJSON от имени пользователя с отчётом об ошибках."""
+        url = reverse('api:v1:ingest')
+        body = '\n'.join([
+            '{"type": "post", "text": "Из импорта"}',
+            '{"type": "post", "author": "author", "text": "Чужой"}',
+        ])
+        response = self.client.post(url, body,
+                                    content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 401)
+        self.client.force_login(self.reader)
+        response = self.client.post(url, body,
+                                    content_type='application/x-ndjson')
+        self.assertEqual(response.json()['posts'], 1)
+        self.assertEqual(response.json()['errors'][0]['line'], 2)
+        self.assertTrue(Post.objects.filter(author=self.reader,
+                                            text='Из импорта').exists())
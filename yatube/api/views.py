@@ -0,0 +1,197 @@
+import functools
+
+from django.http import JsonResponse
+from django.views.decorators.http import (
+    conditional_page, require_GET, require_POST
+)
+
+from core.decorators import anonymous_page_cache
+from posts import page_state
+from posts.feed import FeedPaginator
+from posts.ingest import Ingest
+from posts.models import Comment, Group, Post, User
+from posts.utils import CursorPaginator
+from yatube.settings import AMT_POSTS
+
+NDJSON = 'application/x-ndjson'
+
+# Имя поля в ответе -> выражение для values()
+POST_FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'image': 'image',
+    'comments_count': 'comments_count',
+}
+COMMENT_FIELDS = {
+    'id': 'id',
+    'post': 'post_id',
+    'parent': 'parent_id',
+    'author': 'author__username',
+    'text': 'text',
+    'created': 'created',
+}
+
+
+class BadRequest(Exception):
+    pass
+
+
+def error(message, status):
+    return JsonResponse({'detail': message}, status=status,
+                        json_dumps_params={'ensure_ascii': False})
+
+
+def api_view(view):
+    '''Только GET, ETag по телу ответа и ошибки в виде JSON'''
+    @require_GET
+    @conditional_page
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except BadRequest as exc:
+            return error(str(exc), 400)
+    return wrapper
+
+
+def select_fields(request, available):
+    '''Поля ответа из ?fields=, по умолчанию все'''
+    raw = request.GET.get('fields')
+    if not raw:
+        return dict(available)
+    names = [name.strip() for name in raw.split(',') if name.strip()]
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise BadRequest(f'Неизвестные поля: {", ".join(unknown)}')
+    return {name: available[name] for name in names}
+
+
+def serialize(rows, fields):
+    '''Строки values() в словари ответа без создания моделей'''
+    image_url = Post._meta.get_field('image').storage.url
+    items = []
+    for row in rows:
+        item = {name: row[column] for name, column in fields.items()}
+        if 'image' in item:
+            item['image'] = image_url(item['image']) if item['image'] else None
+        items.append(item)
+    return items
+
+
+def values(queryset, fields, *keys):
+    '''values() по нужным полям плюс ключи курсора'''
+    return queryset.values(*{*fields.values(), *keys})
+
+
+def page_response(page_obj, fields):
+    return JsonResponse({
+        'results': serialize(page_obj, fields),
+        'next_cursor': page_obj.next_cursor,
+        'previous_cursor': page_obj.previous_cursor,
+    }, json_dumps_params={'ensure_ascii': False})
+
+
+def post_page(request, queryset, count=None):
+    fields = select_fields(request, POST_FIELDS)
+    paginator = CursorPaginator(
+        values(queryset, fields, 'id', 'pub_date'), AMT_POSTS, count=count
+    )
+    return page_response(paginator.get_page(request.GET.get('cursor')),
+                         fields)
+
+
+@anonymous_page_cache(page_state.index_state)
+@api_view
+def posts(request):
+    '''Лента всех постов'''
+    return post_page(request, Post.objects.for_listing())
+
+
+@anonymous_page_cache(page_state.group_state)
+@api_view
+def group_posts(request, slug):
+    '''Посты группы'''
+    group = Group.objects.filter(slug=slug).first()
+    if group is None:
+        return error('Группа не найдена', 404)
+    return post_page(request, Post.objects.for_listing().filter(group=group),
+                     count=group.posts_count)
+
+
+@anonymous_page_cache(page_state.profile_state)
+@api_view
+def profile_posts(request, username):
+    '''Посты автора'''
+    author = User.objects.filter(username=username).first()
+    if author is None:
+        return error('Автор не найден', 404)
+    return post_page(request,
+                     Post.objects.for_listing().filter(author=author))
+
+
+@api_view
+def follow_posts(request):
+    '''Лента подписок текущего пользователя'''
+    if not request.user.is_authenticated:
+        return error('Нужна авторизация', 401)
+    fields = select_fields(request, POST_FIELDS)
+    paginator = FeedPaginator(
+        values(Post.objects.for_listing(), fields, 'id', 'pub_date'),
+        request.user,
+        AMT_POSTS,
+    )
+    return page_response(paginator.get_page(request.GET.get('cursor')),
+                         fields)
+
+
+@anonymous_page_cache(page_state.post_detail_state)
+@api_view
+def post_detail(request, post_id):
+    '''Один пост'''
+    fields = select_fields(request, POST_FIELDS)
+    rows = values(Post.objects.filter(pk=post_id), fields)
+    if not rows:
+        return error('Пост не найден', 404)
+    return JsonResponse(serialize(rows, fields)[0],
+                        json_dumps_params={'ensure_ascii': False})
+
+
+@anonymous_page_cache(page_state.post_detail_state)
+@api_view
+def post_comments(request, post_id):
+    '''Комментарии к посту, старые первыми'''
+    if not Post.objects.filter(pk=post_id).exists():
+        return error('Пост не найден', 404)
+    fields = select_fields(request, COMMENT_FIELDS)
+    paginator = CursorPaginator(
+        values(Comment.objects.filter(post_id=post_id)
+               .order_by('created', 'id'), fields, 'id', 'created'),
+        AMT_POSTS, date_field='created', descending=False,
+    )
+    return page_response(paginator.get_page(request.GET.get('cursor')),
+                         fields)
+
+
+@require_POST
+def ingest(request):
+    '''Пакетная загрузка постов и комментариев в NDJSON.
+
+    Обычный пользователь загружает только свои записи и без pub_date
+    и created, сотрудник - записи любых авторов с датами. Картинки -
+    имена файлов, уже лежащих в хранилище.
+    '''
+    if not request.user.is_authenticated:
+        return error('Нужна авторизация', 401)
+    if request.content_type != NDJSON:
+        return error(f'Ожидается {NDJSON}', 415)
+    author = None if request.user.is_staff else request.user
+    result = Ingest(author=author).run(request)
+    return JsonResponse({
+        'posts': result.posts,
+        'comments': result.comments,
+        'errors': [{'line': number, 'detail': message}
+                   for number, message in result.errors],
+    }, json_dumps_params={'ensure_ascii': False})
@@ -0,0 +1,59 @@
+from concurrent.futures import ThreadPoolExecutor
+import logging
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from .db import primary
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.BACKGROUND_WORKERS,
+            thread_name_prefix='yatube-background',
+        )
+    return _executor
+
+
+def _run(func, args, kwargs):
+    try:
+        with primary():
+            func(*args, **kwargs)
+    except Exception:
+        logger.exception('Фоновая задача %s упала', func.__name__)
+    finally:
+        close_old_connections()
+
+
+def run_in_background(func, *args, **kwargs):
+    '''Выполняет func после коммита текущей транзакции.
+
+    При BACKGROUND_WORKERS > 0 задача уходит в пул потоков и запрос её
+    не ждёт, при 0 выполняется сразу в потоке запроса. Задача читает
+    из основной базы: реплика могла ещё не получить то, что её вызвало.
+
+    При BACKGROUND_JOBS задача сразу ставится в очередь jobs в текущей
+    транзакции и видна воркеру run_jobs после коммита; приложение jobs
+    тогда должно быть в INSTALLED_APPS. Тогда func должна
+    быть функцией уровня модуля, а аргументы - сериализоваться в JSON.
+    '''
+    if settings.BACKGROUND_JOBS:
+        # jobs подключается, только если включён: core без него работает
+        from jobs.queue import enqueue
+
+        enqueue(func, args, kwargs)
+        return
+
+    def submit():
+        if settings.BACKGROUND_WORKERS:
+            get_executor().submit(_run, func, args, kwargs)
+        else:
+            with primary():
+                func(*args, **kwargs)
+    transaction.on_commit(submit)
@@ -0,0 +1,8 @@
+from django.conf import settings
+
+
+def fragment_cache(request):
+    """Добавляет время жизни кэшированных фрагментов страниц."""
+    return {
+        'fragment_cache_timeout': settings.FRAGMENT_CACHE_TIMEOUT,
+    }
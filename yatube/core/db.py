@@ -0,0 +1,94 @@
+'''Чтение с реплик, запись в основную базу.
+
+Реплики перечислены в settings.DATABASE_REPLICAS. Чтение идёт на
+случайную реплику, кроме трёх случаев, когда нужна основная база:
+поток закреплён за ней (primary(), PrimaryStickyMiddleware), поток уже
+писал в базу или открыта транзакция основной базы. Так запрос, который
+что-то записал, дальше читает своё, даже если реплики отстают.
+
+Здесь же настройка соединений: PRAGMA для SQLite и проверка постоянных
+соединений перед запросом.
+'''
+import random
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_local = threading.local()
+
+
+def is_pinned():
+    return getattr(_local, 'pinned', False)
+
+
+def has_written():
+    '''Писал ли поток в базу с последнего reset()'''
+    return getattr(_local, 'written', False)
+
+
+def reset(pinned=False):
+    _local.pinned = pinned
+    _local.written = False
+
+
+@contextmanager
+def primary():
+    '''Все чтения внутри блока - из основной базы'''
+    previous = is_pinned()
+    _local.pinned = True
+    try:
+        yield
+    finally:
+        _local.pinned = previous
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if (not replicas or is_pinned()
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        _local.pinned = _local.written = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # На репликах те же строки, что и в основной базе
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схему реплики получают вместе с данными из основной базы
+        return db not in settings.DATABASE_REPLICAS
+
+
+def pragma_statements(pragmas):
+    return [f'PRAGMA {name} = {value}' for name, value in pragmas.items()]
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    '''Ставит SQLITE_PRAGMAS каждому новому соединению SQLite'''
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for statement in pragma_statements(settings.SQLITE_PRAGMAS):
+            cursor.execute(statement)
+
+
+def check_connections(**kwargs):
+    '''Закрывает постоянные соединения, которые перестали отвечать.
+
+    Django 2.2 проверяет соединение, только если в нём уже была ошибка,
+    а сервер базы мог закрыть его, пока оно ждало следующего запроса.
+    Закрытое соединение откроется заново при первом обращении.
+    '''
+    if not settings.DB_HEALTH_CHECKS:
+        return
+    for connection in connections.all():
+        if (connection.connection is not None
+                and not connection.in_atomic_block
+                and not connection.is_usable()):
+            connection.close()
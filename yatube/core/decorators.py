@@ -0,0 +1,50 @@
+import functools
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import (get_conditional_response,
+                                patch_cache_control, patch_vary_headers)
+from django.utils.http import quote_etag
+
+
+def anonymous_page_cache(page_state, timeout=None):
+    '''Кэш целых страниц для анонимов с условным GET.
+
+    page_state(request, *args, **kwargs) возвращает версию данных или
+    None, если кэшировать нельзя. По ней строится ETag; совпавший запрос
+    получает 304 без вызова представления, остальные анонимные запросы
+    обслуживаются сохранённым ответом. Авторизованные пользователи
+    идут мимо этого кэша.
+
+    Last-Modified не ставится: правка или удаление поста, переименование
+    автора или группы меняют версию, но не даты на странице, и клиент
+    с одним If-Modified-Since получал бы 304 на изменённую страницу.
+    '''
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (request.method not in ('GET', 'HEAD')
+                    or request.user.is_authenticated):
+                return view(request, *args, **kwargs)
+            version = page_state(request, *args, **kwargs)
+            if version is None:
+                return view(request, *args, **kwargs)
+            path = request.get_full_path()
+            digest = hashlib.md5(f'{path}:{version}'.encode()).hexdigest()
+            etag = quote_etag(digest)
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                key = f'anonymous_page:{digest}'
+                response = cache.get(key)
+                if response is None:
+                    response = view(request, *args, **kwargs)
+                    if response.status_code == 200 and not response.cookies:
+                        cache.set(key, response, timeout
+                                  or settings.ANONYMOUS_PAGE_CACHE_TIMEOUT)
+            response['ETag'] = etag
+            patch_cache_control(response, max_age=0, must_revalidate=True)
+            patch_vary_headers(response, ('Cookie',))
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,173 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (
+    FileResponse, Http404, HttpResponse, StreamingHttpResponse
+)
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+# Имя с хэшем содержимого: manifest-статика, картинки постов, кэш sorl
+HASHED_NAME = re.compile(r'(^|[./_])[0-9a-f]{12,}([._]|$)')
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+# Предсжатые копии в порядке предпочтения: кодировка и расширение
+PRECOMPRESSED = (('br', '.br'), ('gzip', '.gz'))
+BLOCK_SIZE = 64 * 1024
+
+
+def cache_control(path):
+    '''Файл с хэшем в имени не меняется, его можно кэшировать навсегда'''
+    if HASHED_NAME.search(os.path.basename(path)):
+        return IMMUTABLE
+    return f'public, max-age={settings.MEDIA_MAX_AGE}'
+
+
+def parse_range(header, size):
+    '''Границы (start, end) одного диапазона Range или None для всего файла.
+
+    Несколько диапазонов сразу не поддерживаются, такой запрос получает
+    весь файл. Для диапазона за концом файла поднимается ValueError.
+    '''
+    match = RANGE.match(header or '')
+    if match is None or not any(match.groups()):
+        return None
+    start, end = match.groups()
+    if not start:
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+    if start > end or start >= size:
+        raise ValueError(header)
+    return start, end
+
+
+def read_range(handle, start, length):
+    with handle:
+        handle.seek(start)
+        while length > 0:
+            chunk = handle.read(min(BLOCK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def accepted_encodings(header):
+    '''Словарь {кодировка: q} из заголовка Accept-Encoding'''
+    accepted = {}
+    for item in header.split(','):
+        token, *params = [part.strip() for part in item.split(';')]
+        if not token:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[token.lower()] = quality
+    return accepted
+
+
+def pick_encoding(request, full_path):
+    '''Предсжатая копия файла, которую принимает клиент.
+
+    Из кодировок с q > 0 берётся с наибольшим q, при равных - в порядке
+    PRECOMPRESSED. «*» задаёт q для кодировок, не названных явно.
+    '''
+    accepted = accepted_encodings(
+        request.META.get('HTTP_ACCEPT_ENCODING', '')
+    )
+    default = accepted.get('*', 0.0)
+    candidates = [
+        (accepted.get(encoding, default), encoding, extension)
+        for encoding, extension in PRECOMPRESSED
+    ]
+    for quality, encoding, extension in sorted(
+            candidates, key=lambda candidate: -candidate[0]):
+        if quality > 0 and os.path.isfile(full_path + extension):
+            return encoding, extension
+    return None, ''
+
+
+def serve_file(request, path, document_root, root_name, compressed=False):
+    '''Отдаёт файл из document_root с кэшированием и диапазонами.
+
+    При SENDFILE_BACKEND тело отдаёт веб-сервер (X-Accel-Redirect
+    для nginx или X-Sendfile для Apache/lighttpd), иначе файл читается
+    блоками, Range отдаёт 206. ETag и Last-Modified строятся из mtime
+    и размера, поэтому повторный запрос получает 304 без чтения файла.
+    '''
+    try:
+        full_path = safe_join(document_root, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+    encoding, extension = None, ''
+    if compressed:
+        encoding, extension = pick_encoding(request, full_path)
+    full_path += extension
+    stat = os.stat(full_path)
+    etag = quote_etag(f'{stat.st_mtime_ns:x}-{stat.st_size:x}')
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(stat.st_mtime)
+    )
+    if response is None:
+        response = file_response(request, full_path, stat, etag,
+                                 f'{root_name}/{path}{extension}')
+    content_type, _ = mimetypes.guess_type(path)
+    response['Content-Type'] = content_type or 'application/octet-stream'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = cache_control(path)
+    if compressed:
+        response['Vary'] = 'Accept-Encoding'
+    if encoding:
+        response['Content-Encoding'] = encoding
+    return response
+
+
+def file_response(request, full_path, stat, etag, location):
+    backend = settings.SENDFILE_BACKEND
+    if backend == 'x-accel-redirect':
+        response = HttpResponse()
+        response['X-Accel-Redirect'] = (
+            settings.SENDFILE_URL + quote(location)
+        )
+        return response
+    if backend == 'x-sendfile':
+        response = HttpResponse()
+        response['X-Sendfile'] = full_path
+        return response
+    if_range = request.META.get('HTTP_IF_RANGE')
+    header = request.META.get('HTTP_RANGE')
+    if if_range and if_range != etag:
+        header = None
+    try:
+        bounds = parse_range(header, stat.st_size)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{stat.st_size}'
+        return response
+    if bounds is None:
+        response = FileResponse(open(full_path, 'rb'))
+    else:
+        start, end = bounds
+        response = StreamingHttpResponse(
+            read_range(open(full_path, 'rb'), start, end - start + 1),
+            status=206,
+        )
+        response['Content-Length'] = end - start + 1
+        response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+    response['Accept-Ranges'] = 'bytes'
+    return response
@@ -0,0 +1,129 @@
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.db import pragma_statements
+
+SCHEMA = (
+    'CREATE TABLE post (id INTEGER PRIMARY KEY, author INTEGER NOT NULL, '
+    'text TEXT NOT NULL, created REAL NOT NULL)',
+    'CREATE INDEX post_author ON post (author, id)',
+)
+READ = 'SELECT id, text FROM post WHERE author = ? ORDER BY id DESC LIMIT 10'
+WRITE = 'INSERT INTO post (author, text, created) VALUES (?, ?, ?)'
+AUTHORS = 100
+
+
+def connect(path, pragmas):
+    connection = sqlite3.connect(path, check_same_thread=False)
+    for statement in pragma_statements(pragmas):
+        connection.execute(statement)
+    return connection
+
+
+def prepare(path, pragmas, rows):
+    connection = connect(path, pragmas)
+    with connection:
+        for statement in SCHEMA:
+            connection.execute(statement)
+        connection.executemany(WRITE, [
+            (number % AUTHORS, f'Пост {number}', time.time())
+            for number in range(rows)
+        ])
+    connection.close()
+
+
+def work(path, pragmas, persistent, write, deadline):
+    '''Операции и ошибки блокировки одного потока до deadline.
+
+    Без persistent соединение открывается на каждую операцию, как при
+    CONN_MAX_AGE = 0.
+    '''
+    rng = random.Random()
+    done = errors = 0
+    connection = None
+    while time.monotonic() < deadline:
+        if connection is None:
+            connection = connect(path, pragmas)
+        try:
+            if write:
+                with connection:
+                    connection.execute(WRITE, (
+                        rng.randrange(AUTHORS), 'Новый пост', time.time()
+                    ))
+            else:
+                connection.execute(READ, (rng.randrange(AUTHORS),)).fetchall()
+            done += 1
+        except sqlite3.OperationalError:
+            errors += 1
+        if not persistent:
+            connection.close()
+            connection = None
+    if connection is not None:
+        connection.close()
+    return write, done, errors
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пропускную способность SQLite при одновременных '
+            'чтении и записи: новое или постоянное соединение, журнал '
+            'по умолчанию или SQLITE_PRAGMAS')
+
+    def add_arguments(self, parser):
+        for name, default, help_text in (
+            ('readers', 4, 'Потоков чтения'),
+            ('writers', 2, 'Потоков записи'),
+            ('rows', 10000, 'Строк в таблице перед замером'),
+        ):
+            parser.add_argument(f'--{name}', type=int, default=default,
+                                help=help_text)
+        parser.add_argument(
+            '--seconds', type=float, default=3,
+            help='Длительность замера каждого режима',
+        )
+
+    def handle(self, *args, **options):
+        if options['readers'] + options['writers'] < 1:
+            raise CommandError('Нужен хотя бы один поток')
+        modes = [
+            (f'{connection}, {journal}', persistent, pragmas)
+            for journal, pragmas in (('по умолчанию', {}),
+                                     ('SQLITE_PRAGMAS',
+                                      settings.SQLITE_PRAGMAS))
+            for connection, persistent in (('новое', False),
+                                           ('постоянное', True))
+        ]
+        self.stdout.write(f'{"соединение, настройки":<32}'
+                          f'{"чтений/с":>10}{"записей/с":>11}{"ошибок":>8}')
+        with tempfile.TemporaryDirectory() as directory:
+            for number, (name, persistent, pragmas) in enumerate(modes):
+                # journal_mode=WAL остаётся в файле, каждому режиму свой
+                path = os.path.join(directory, f'{number}.sqlite3')
+                prepare(path, pragmas, options['rows'])
+                reads, writes, errors = self.measure(
+                    path, pragmas, persistent, options
+                )
+                self.stdout.write(f'{name:<32}{reads:>10.0f}{writes:>11.0f}'
+                                  f'{errors:>8}')
+
+    def measure(self, path, pragmas, persistent, options):
+        threads = options['readers'] + options['writers']
+        deadline = time.monotonic() + options['seconds']
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            futures = [
+                executor.submit(work, path, pragmas, persistent,
+                                number < options['writers'], deadline)
+                for number in range(threads)
+            ]
+            results = [future.result() for future in futures]
+        reads = sum(done for write, done, _ in results if not write)
+        writes = sum(done for write, done, _ in results if write)
+        errors = sum(failed for _, _, failed in results)
+        return (reads / options['seconds'], writes / options['seconds'],
+                errors)
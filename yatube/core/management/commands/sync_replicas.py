@@ -0,0 +1,32 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = ('Копирует основную базу SQLite в реплики из DATABASE_REPLICAS. '
+            'Для проверки чтения с реплик локально: между запусками '
+            'реплики отстают, как при настоящей репликации')
+
+    def handle(self, *args, **options):
+        primary = connections[DEFAULT_DB_ALIAS]
+        aliases = settings.DATABASE_REPLICAS
+        if primary.vendor != 'sqlite' or any(
+                connections[alias].vendor != 'sqlite' for alias in aliases):
+            raise CommandError('Копировать можно только SQLite в SQLite, '
+                               'остальные базы реплицирует сама СУБД')
+        if not aliases:
+            raise CommandError('Реплики не заданы: DATABASE_REPLICA_PATHS')
+        primary.ensure_connection()
+        for alias in aliases:
+            connections[alias].close()
+            # Резервное копирование SQLite даёт согласованный снимок
+            # даже при открытых соединениях к обеим базам
+            target = sqlite3.connect(connections[alias].settings_dict['NAME'])
+            try:
+                primary.connection.backup(target)
+            finally:
+                target.close()
+            self.stdout.write(f'{alias}: скопирована')
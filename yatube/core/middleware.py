@@ -0,0 +1,239 @@
+from contextlib import ExitStack, contextmanager
+import functools
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.base import Template
+
+from . import db
+
+logger = logging.getLogger('yatube.requests')
+
+_local = threading.local()
+_MISSING = object()
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+
+def current_metrics():
+    return getattr(_local, 'metrics', None)
+
+
+def _time_template(render):
+    @functools.wraps(render)
+    def wrapper(self, context):
+        metrics = current_metrics()
+        if metrics is None:
+            return render(self, context)
+        # Вложенные include считаются внутри внешнего шаблона.
+        metrics.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            metrics.template_depth -= 1
+            if not metrics.template_depth:
+                metrics.template_time += time.perf_counter() - started
+    wrapper.metrics_wrapped = True
+    return wrapper
+
+
+@contextmanager
+def _outermost():
+    '''True только для внешнего обращения к кэшу.
+
+    BaseCache.get_many вызывает get, TwoTierCache - методы общего кэша;
+    вложенные обращения уже посчитаны внешним.
+    '''
+    if getattr(_local, 'cache_call', False):
+        yield False
+        return
+    _local.cache_call = True
+    try:
+        yield True
+    finally:
+        _local.cache_call = False
+
+
+def _count_cache_get(get):
+    @functools.wraps(get)
+    def wrapper(self, key, default=None, version=None):
+        with _outermost() as outermost:
+            value = get(self, key, _MISSING, version)
+        metrics = current_metrics()
+        if outermost and metrics is not None:
+            if value is _MISSING:
+                metrics.cache_misses += 1
+            else:
+                metrics.cache_hits += 1
+        return default if value is _MISSING else value
+    wrapper.metrics_wrapped = True
+    return wrapper
+
+
+def _count_cache_get_many(get_many):
+    @functools.wraps(get_many)
+    def wrapper(self, keys, version=None):
+        keys = list(keys)
+        with _outermost() as outermost:
+            values = get_many(self, keys, version=version)
+        metrics = current_metrics()
+        if outermost and metrics is not None:
+            metrics.cache_hits += len(values)
+            metrics.cache_misses += len(keys) - len(values)
+        return values
+    wrapper.metrics_wrapped = True
+    return wrapper
+
+
+def _patch(owner, name, decorator):
+    '''Оборачивает метод, если он ещё не обёрнут; возвращает отмену'''
+    method = getattr(owner, name)
+    if getattr(method, 'metrics_wrapped', False):
+        return None
+    own = owner.__dict__.get(name)
+    setattr(owner, name, decorator(method))
+    if own is None:
+        return lambda: delattr(owner, name)
+    return lambda: setattr(owner, name, own)
+
+
+def install_instrumentation():
+    '''Оборачивает рендер шаблонов и чтение из кэша счётчиками запроса.
+
+    Возвращает функцию, которая снимает поставленные этим вызовом
+    обёртки: тестам, чтобы не менять классы для следующих тестов.
+    '''
+    undo = [_patch(Template, 'render', _time_template)]
+    for alias in settings.CACHES:
+        backend = type(caches[alias])
+        undo.append(_patch(backend, 'get', _count_cache_get))
+        undo.append(_patch(backend, 'get_many', _count_cache_get_many))
+
+    def uninstall():
+        for restore in reversed(undo):
+            if restore is not None:
+                restore()
+    return uninstall
+
+
+class RequestMetricsMiddleware:
+    '''Считает SQL, время шаблонов и обращения к кэшу для каждого запроса.
+
+    Итог отдаётся заголовком Server-Timing и строкой лога
+    yatube.requests; при превышении бюджета представления пишется
+    предупреждение. Выключенный через REQUEST_METRICS['ENABLED']
+    middleware убирается из цепочки и ничего не стоит.
+    '''
+
+    def __init__(self, get_response):
+        config = settings.REQUEST_METRICS
+        if not config['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.default_budget = config['DEFAULT_BUDGET']
+        self.budgets = config['BUDGETS']
+        install_instrumentation()
+
+    def __call__(self, request):
+        metrics = _local.metrics = RequestMetrics()
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(self.time_query)
+                    )
+                response = self.get_response(request)
+        finally:
+            _local.metrics = None
+        total = time.perf_counter() - started
+        self.report(request, response, metrics, total)
+        return response
+
+    def time_query(self, execute, sql, params, many, context):
+        metrics = current_metrics()
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            if metrics is not None:
+                metrics.queries += 1
+                metrics.sql_time += time.perf_counter() - started
+
+    def report(self, request, response, metrics, total):
+        match = request.resolver_match
+        view_name = match.view_name if match else request.path
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={metrics.sql_time * 1000:.1f};'
+            f'desc="{metrics.queries} queries"',
+            f'tpl;dur={metrics.template_time * 1000:.1f}',
+            f'cache;desc="hit={metrics.cache_hits} '
+            f'miss={metrics.cache_misses}"',
+            f'total;dur={total * 1000:.1f}',
+        ])
+        fields = {
+            'view': view_name,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 1),
+            'queries': metrics.queries,
+            'sql_ms': round(metrics.sql_time * 1000, 1),
+            'template_ms': round(metrics.template_time * 1000, 1),
+            'cache_hits': metrics.cache_hits,
+            'cache_misses': metrics.cache_misses,
+        }
+        line = ' '.join(f'{key}={value}' for key, value in fields.items())
+        logger.info(line, extra={'metrics': fields})
+        budget = {**self.default_budget, **self.budgets.get(view_name, {})}
+        if (metrics.queries > budget['queries']
+                or fields['sql_ms'] > budget['sql_ms']):
+            logger.warning(
+                'Превышен бюджет %s (queries=%s, sql_ms=%s): %s',
+                view_name, budget['queries'], budget['sql_ms'], line,
+                extra={'metrics': fields},
+            )
+
+
+class PrimaryStickyMiddleware:
+    '''Закрепляет пользователя за основной базой после записи.
+
+    Запрос, который писал в базу, ставит куку на PRIMARY_STICKY_SECONDS.
+    Пока она жива, а также в запросах с небезопасным методом все чтения
+    идут в основную базу: автор сразу видит свой пост или комментарий,
+    даже если реплики ещё не догнали основную базу. Кука ничего
+    не открывает, поэтому подписывать её не нужно.
+    '''
+
+    SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        cookie = settings.PRIMARY_STICKY_COOKIE
+        db.reset(pinned=cookie in request.COOKIES
+                 or request.method not in self.SAFE_METHODS)
+        try:
+            response = self.get_response(request)
+            written = db.has_written()
+        finally:
+            db.reset()
+        if written:
+            response.set_cookie(
+                cookie, '1', max_age=settings.PRIMARY_STICKY_SECONDS,
+                httponly=True, samesite='Lax',
+            )
+        return response
@@ -0,0 +1,23 @@
+from django import template
+
+from posts import images, thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def rendition_url(image, rendition):
+    '''Адрес заранее готовой миниатюры, пока её нет - адрес оригинала.
+
+    Шаблон никогда не уменьшает картинку сам: миниатюры создаёт
+    фоновая задача после сохранения поста. Для постов страницы,
+    подготовленных thumbnails.attach, адреса ищутся одним запросом.
+    '''
+    if not image:
+        return ''
+    return thumbnails.ready_url(image, rendition) or image.url
+
+
+@register.filter
+def srcset(value):
+    return images.srcset(value)
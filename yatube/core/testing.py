@@ -0,0 +1,20 @@
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    '''Запускает тесты с фоновыми задачами в потоке запроса.
+
+    Тестовая база SQLite в памяти не выдерживает записи из пула потоков,
+    поэтому BACKGROUND_WORKERS = 0. Тесты самого пула включают его
+    через override_settings.
+    '''
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.test_settings = override_settings(BACKGROUND_WORKERS=0)
+        self.test_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.test_settings.disable()
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,74 @@
+import subprocess
+import sys
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.test import (
+    SimpleTestCase, TransactionTestCase, override_settings
+)
+
+from core import background, db
+
+TIMEOUT = 5
+
+
+@override_settings(BACKGROUND_WORKERS=2, BACKGROUND_JOBS=False)
+class ThreadPoolTests(TransactionTestCase):
+    def setUp(self):
+        self.done = threading.Event()
+        self.calls = []
+
+    def tearDown(self):
+        if background._executor is not None:
+            background._executor.shutdown(wait=True)
+            background._executor = None
+
+    def task(self, value, fail=False):
+        self.calls.append(
+            (value, threading.current_thread().name, db.is_pinned())
+        )
+        self.done.set()
+        if fail:
+            raise ValueError(value)
+
+    def test_task_runs_in_pool_after_commit(self):
+        """Задача уходит в пул после коммита и читает из основной базы."""
+        with transaction.atomic():
+            background.run_in_background(self.task, 'пост')
+            self.assertEqual(self.calls, [])
+        self.assertTrue(self.done.wait(TIMEOUT))
+        [(value, thread, pinned)] = self.calls
+        self.assertEqual(value, 'пост')
+        self.assertTrue(thread.startswith('yatube-background'))
+        self.assertTrue(pinned)
+
+    def test_rolled_back_task_is_dropped(self):
+        """Задача откаченной транзакции не выполняется."""
+        with transaction.atomic():
+            background.run_in_background(self.task, 'пост')
+            transaction.set_rollback(True)
+        self.assertFalse(self.done.wait(0.2))
+
+    def test_failed_task_is_logged(self):
+        """Ошибка задачи пишется в журнал и не мешает следующим."""
+        with self.assertLogs('core.background', 'ERROR'):
+            background.run_in_background(self.task, 'первый', fail=True)
+            self.assertTrue(self.done.wait(TIMEOUT))
+            background._executor.shutdown(wait=True)
+        background._executor = None
+        self.done.clear()
+        background.run_in_background(self.task, 'второй')
+        self.assertTrue(self.done.wait(TIMEOUT))
+        self.assertEqual([value for value, _, _ in self.calls],
+                         ['первый', 'второй'])
+
+
+class WithoutJobsTests(SimpleTestCase):
+    def test_core_does_not_import_jobs(self):
+        """core.background импортируется без приложения jobs."""
+        subprocess.run(
+            [sys.executable, '-c',
+             "import sys; sys.modules['jobs'] = None; import core.background"],
+            cwd=settings.BASE_DIR, check=True,
+        )
@@ -0,0 +1,49 @@
+import shutil
+import tempfile
+
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+
+CACHE_DIR = tempfile.mkdtemp()
+
+TWO_TIER_CACHES = {
+    'default': {
+        'BACKEND': 'core.cache.TwoTierCache',
+        'OPTIONS': {'SHARED': 'shared', 'LOCAL_TIMEOUT': 60},
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': CACHE_DIR,
+    },
+}
+
+
+@override_settings(CACHES=TWO_TIER_CACHES)
+class TwoTierCacheTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(CACHE_DIR, ignore_errors=True)
+
+    def setUp(self):
+        caches['default'].clear()
+
+    def test_hot_key_is_served_locally(self):
+        """Прочитанный ключ отдаётся из локального яруса."""
+        cache, shared = caches['default'], caches['shared']
+        shared.set('key', 'shared value')
+        self.assertEqual(cache.get('key'), 'shared value')
+        shared.set('key', 'changed elsewhere')
+        self.assertEqual(cache.get('key'), 'shared value')
+
+    def test_writes_reach_shared_backend(self):
+        """Запись и incr идут в общий кэш и обновляют локальный ярус."""
+        cache, shared = caches['default'], caches['shared']
+        cache.set('counter', 1)
+        self.assertEqual(shared.get('counter'), 1)
+        cache.get('counter')
+        cache.incr('counter')
+        self.assertEqual(cache.get('counter'), 2)
+        self.assertEqual(cache.get_many(['counter', 'none']), {'counter': 2})
+        cache.delete('counter')
+        self.assertIsNone(cache.get('counter'))
@@ -0,0 +1,104 @@
+import io
+
+from django.core.management import call_command
+from django.db import connection, router
+from django.http import HttpResponse
+from django.test import (
+    Client, RequestFactory, SimpleTestCase, TestCase, override_settings
+)
+from django.urls import reverse
+
+from core import db
+from core.middleware import PrimaryStickyMiddleware
+from posts.models import Post, User
+
+REPLICAS = ['replica1', 'replica2']
+
+
+@override_settings(DATABASE_REPLICAS=REPLICAS, PRIMARY_STICKY_SECONDS=5)
+class PrimaryReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        db.reset()
+        self.addCleanup(db.reset)
+
+    def test_reads_go_to_replicas_until_write(self):
+        """Чтение идёт на реплику, после записи - в основную базу."""
+        self.assertIn(router.db_for_read(Post), REPLICAS)
+        self.assertEqual(router.db_for_write(Post), 'default')
+        self.assertEqual(router.db_for_read(Post), 'default')
+        self.assertTrue(db.has_written())
+
+    def test_primary_block(self):
+        """Внутри primary() чтение из основной базы."""
+        with db.primary():
+            self.assertEqual(router.db_for_read(Post), 'default')
+        self.assertIn(router.db_for_read(Post), REPLICAS)
+
+    def test_replicas_are_not_migrated(self):
+        self.assertTrue(router.allow_migrate('default', 'posts'))
+        self.assertFalse(router.allow_migrate('replica1', 'posts'))
+
+    def request(self, view, method='get', **cookies):
+        factory = RequestFactory()
+        factory.cookies.load(cookies)
+        middleware = PrimaryStickyMiddleware(view)
+        return middleware(getattr(factory, method)('/'))
+
+    def test_write_sets_sticky_cookie(self):
+        """Запрос с записью ставит куку, без записи - нет."""
+        def write(request):
+            router.db_for_write(Post)
+            return HttpResponse()
+
+        response = self.request(write, 'post')
+        cookie = response.cookies['primary_sticky']
+        self.assertEqual(cookie['max-age'], 5)
+        response = self.request(lambda request: HttpResponse())
+        self.assertNotIn('primary_sticky', response.cookies)
+        self.assertFalse(db.is_pinned())
+
+    def test_sticky_cookie_pins_reads(self):
+        """С кукой и в небезопасных запросах чтение из основной базы."""
+        def read(request):
+            return HttpResponse(router.db_for_read(Post))
+
+        self.assertIn(self.request(read).content.decode(), REPLICAS)
+        for response in (self.request(read, primary_sticky='1'),
+                         self.request(read, 'post')):
+            self.assertEqual(response.content, b'default')
+
+
+class PrimaryStickyViewTests(TestCase):
+    def test_comment_pins_author_to_primary(self):
+        """Комментарий закрепляет автора за основной базой."""
+        author = User.objects.create_user(username='author')
+        post = Post.objects.create(author=author, text='Тестовый пост')
+        client = Client()
+        client.force_login(author)
+        response = client.post(
+            reverse('posts:add_comment', kwargs={'post_id': post.pk}),
+            {'text': 'Комментарий'},
+        )
+        self.assertIn('primary_sticky', response.cookies)
+
+
+class ConnectionSettingsTests(TestCase):
+    def test_sqlite_pragmas(self):
+        """Новое соединение SQLite получает PRAGMA из настроек."""
+        with connection.cursor() as cursor:
+            for name, expected in (('synchronous', 1),
+                                   ('busy_timeout', 5000),
+                                   ('cache_size', -64 * 1024)):
+                with self.subTest(name=name):
+                    cursor.execute(f'PRAGMA {name}')
+                    self.assertEqual(cursor.fetchone()[0], expected)
+
+    def test_db_benchmark(self):
+        """Замер проходит все четыре режима без ошибок блокировки."""
+        out = io.StringIO()
+        call_command('db_benchmark', readers=1, writers=1, rows=100,
+                     seconds=0.1, stdout=out)
+        lines = out.getvalue().splitlines()[1:]
+        self.assertEqual(len(lines), 4)
+        for line in lines:
+            self.assertTrue(line.endswith(' 0'), line)
@@ -0,0 +1,168 @@
+import gzip
+import io
+import os
+import shutil
+import tempfile
+
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.test import (
+    RequestFactory, SimpleTestCase, TestCase, override_settings
+)
+
+from core.files import pick_encoding
+
+MEDIA_ROOT = tempfile.mkdtemp()
+STATIC_DIR = tempfile.mkdtemp()
+STATIC_ROOT = tempfile.mkdtemp()
+CONTENT = bytes(range(256)) * 4
+CSS = b'body { margin: 0; }\n' * 50
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, SENDFILE_BACKEND='')
+class ServeMediaTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        os.makedirs(os.path.join(MEDIA_ROOT, 'posts'), exist_ok=True)
+        cls.hashed = 'posts/' + 'ab' * 32 + '.bin'
+        for name in (cls.hashed, 'posts/plain.bin'):
+            with open(os.path.join(MEDIA_ROOT, name), 'wb') as file:
+                file.write(CONTENT)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def test_hashed_file_is_immutable(self):
+        """Файл с хэшем в имени кэшируется навсегда, без хэша - на час."""
+        response = self.client.get(f'/media/{self.hashed}')
+        self.assertEqual(b''.join(response.streaming_content), CONTENT)
+        self.assertIn('immutable', response['Cache-Control'])
+        response = self.client.get('/media/posts/plain.bin')
+        self.assertNotIn('immutable', response['Cache-Control'])
+
+    def test_range_request(self):
+        """Range отдаёт 206 с куском файла, диапазон за концом - 416."""
+        response = self.client.get(
+            f'/media/{self.hashed}', HTTP_RANGE='bytes=10-19'
+        )
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), CONTENT[10:20])
+        self.assertEqual(response['Content-Range'],
+                         f'bytes 10-19/{len(CONTENT)}')
+        response = self.client.get(
+            f'/media/{self.hashed}', HTTP_RANGE='bytes=-5'
+        )
+        self.assertEqual(b''.join(response.streaming_content), CONTENT[-5:])
+        response = self.client.get(
+            f'/media/{self.hashed}', HTTP_RANGE=f'bytes={len(CONTENT)}-'
+        )
+        self.assertEqual(response.status_code, 416)
+
+    def test_conditional_request(self):
+        """Повторный запрос с ETag получает 304."""
+        response = self.client.get(f'/media/{self.hashed}')
+        response = self.client.get(
+            f'/media/{self.hashed}', HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(response.status_code, 304)
+
+    @override_settings(SENDFILE_BACKEND='x-accel-redirect',
+                       SENDFILE_URL='/protected/')
+    def test_x_accel_redirect(self):
+        """С nginx тело файла отдаёт веб-сервер."""
+        response = self.client.get(f'/media/{self.hashed}')
+        self.assertEqual(response['X-Accel-Redirect'],
+                         f'/protected/media/{self.hashed}')
+        self.assertEqual(response.content, b'')
+
+    @override_settings(SENDFILE_BACKEND='x-accel-redirect',
+                       SENDFILE_URL='/protected/')
+    def test_x_accel_redirect_quotes_path(self):
+        """Путь в X-Accel-Redirect экранируется."""
+        name = 'posts/кот и пёс.bin'
+        with open(os.path.join(MEDIA_ROOT, name), 'wb') as file:
+            file.write(CONTENT)
+        response = self.client.get(f'/media/{name}')
+        self.assertEqual(
+            response['X-Accel-Redirect'],
+            '/protected/media/posts/%D0%BA%D0%BE%D1%82%20%D0%B8%20'
+            '%D0%BF%D1%91%D1%81.bin',
+        )
+
+    def test_path_outside_root(self):
+        """Путь за пределами MEDIA_ROOT не отдаётся."""
+        response = self.client.get('/media/../settings.py')
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(
+    STATICFILES_DIRS=[STATIC_DIR],
+    STATIC_ROOT=STATIC_ROOT,
+    STATICFILES_STORAGE='core.storage.CompressedManifestStaticFilesStorage',
+)
+class CompressedStaticTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        os.makedirs(os.path.join(STATIC_DIR, 'css'), exist_ok=True)
+        with open(os.path.join(STATIC_DIR, 'css', 'site.css'), 'wb') as file:
+            file.write(CSS)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(STATIC_DIR, ignore_errors=True)
+        shutil.rmtree(STATIC_ROOT, ignore_errors=True)
+
+    def test_collectstatic_writes_precompressed_copies(self):
+        """Собранная статика получает хэш в имени и сжатую копию."""
+        call_command('collectstatic', interactive=False, verbosity=0,
+                     stdout=io.StringIO())
+        name = staticfiles_storage.stored_name('css/site.css')
+        self.assertNotEqual(name, 'css/site.css')
+        response = self.client.get(f'/static/{name}',
+                                   HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertIn('immutable', response['Cache-Control'])
+        body = b''.join(response.streaming_content)
+        self.assertEqual(gzip.decompress(body), CSS)
+
+
+class PickEncodingTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.mkdtemp()
+        cls.path = os.path.join(cls.directory, 'site.css')
+        for extension in ('', '.br', '.gz'):
+            with open(cls.path + extension, 'wb') as file:
+                file.write(CSS)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(cls.directory, ignore_errors=True)
+
+    def pick(self, header):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING=header)
+        return pick_encoding(request, self.path)[0]
+
+    def test_quality_values(self):
+        """Кодировка выбирается по q, q=0 её запрещает."""
+        for header, expected in (
+            ('gzip, br', 'br'),
+            ('br;q=0, gzip', 'gzip'),
+            ('br; q=0.0, gzip;q=0', None),
+            ('br;q=0.5, gzip;q=0.8', 'gzip'),
+            ('*', 'br'),
+            ('*;q=0, gzip', 'gzip'),
+            ('identity', None),
+            ('x-gzip-custom, brotli', None),
+            ('', None),
+        ):
+            with self.subTest(header=header):
+                self.assertEqual(self.pick(header), expected)
@@ -0,0 +1,98 @@
+import shutil
+import tempfile
+
+from django.core.cache import caches
+from django.template.base import Template
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core import middleware
+from posts.models import Post, User
+
+METRICS = {
+    'ENABLED': True,
+    'DEFAULT_BUDGET': {'queries': 20, 'sql_ms': 1000},
+    'BUDGETS': {'posts:index': {'queries': 0}},
+}
+
+
+class RequestMetricsMiddlewareTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        Post.objects.create(author=cls.author, text='Тестовый текст поста')
+
+    @override_settings(REQUEST_METRICS=METRICS)
+    def test_server_timing_and_budget_warning(self):
+        """Метрики попадают в Server-Timing, превышение бюджета в лог."""
+        # Обёртки ставятся заранее, чтобы снять их после теста
+        self.addCleanup(middleware.install_instrumentation())
+        # Аноним получает страницу из кэша без SQL, бюджет превышает
+        # пользователь
+        client = Client()
+        client.force_login(self.author)
+        with self.assertLogs('yatube.requests', 'INFO') as logs:
+            response = client.get(reverse('posts:index'))
+        timing = response['Server-Timing']
+        self.assertIn('db;dur=', timing)
+        self.assertIn('tpl;dur=', timing)
+        self.assertIn('cache;desc=', timing)
+        self.assertIn('view=posts:index', logs.output[0])
+        self.assertTrue(logs.output[1].startswith('WARNING'))
+
+    def test_disabled_middleware_adds_nothing(self):
+        """Выключенный middleware не трогает ответ."""
+        response = Client().get(reverse('posts:index'))
+        self.assertNotIn('Server-Timing', response)
+
+
+class CacheCountTests(TestCase):
+    def count(self, call):
+        self.addCleanup(middleware.install_instrumentation())
+        metrics = middleware._local.metrics = middleware.RequestMetrics()
+        try:
+            call()
+        finally:
+            middleware._local.metrics = None
+        return metrics.cache_hits, metrics.cache_misses
+
+    def test_get_many_counts_each_key_once(self):
+        """get_many через get считает каждый ключ один раз."""
+        cache = caches['default']
+        cache.set('hit', 1)
+        self.assertEqual(self.count(lambda: cache.get_many(['hit', 'miss'])),
+                         (1, 1))
+        self.assertEqual(self.count(lambda: cache.get('miss')), (0, 1))
+
+    def test_two_tier_cache_counts_outer_call(self):
+        """Обращение к общему ярусу не считается второй раз."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        with self.settings(CACHES={
+            'default': {
+                'BACKEND': 'core.cache.TwoTierCache',
+                'OPTIONS': {'SHARED': 'shared', 'LOCAL_TIMEOUT': 60},
+            },
+            'shared': {
+                'BACKEND':
+                    'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': directory,
+            },
+        }):
+            caches['shared'].set('hit', 1)
+            cache = caches['default']
+            self.assertEqual(
+                self.count(lambda: cache.get_many(['hit', 'miss'])), (1, 1)
+            )
+            self.assertEqual(self.count(lambda: cache.get('miss')), (0, 1))
+
+    def test_instrumentation_is_removed(self):
+        """После теста классы кэша и шаблонов остаются без обёрток."""
+        backend = type(caches['default'])
+        methods = (Template.render, backend.get, backend.get_many)
+        uninstall = middleware.install_instrumentation()
+        self.assertTrue(backend.get.metrics_wrapped)
+        uninstall()
+        self.assertEqual((Template.render, backend.get, backend.get_many),
+                         methods)
@@ -1,5 +1,8 @@
+from django.conf import settings
 from django.shortcuts import render
 
+from .files import serve_file
+
 
 def page_not_found(request, exception):
     return render(request, 'core/404.html', {'path': request.path}, status=404)
@@ -15,3 +18,12 @@ def permission_denied(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+def serve_media(request, path):
+    return serve_file(request, path, settings.MEDIA_ROOT, 'media')
+
+
+def serve_static(request, path):
+    return serve_file(request, path, settings.STATIC_ROOT, 'static',
+                      compressed=True)
@@ -0,0 +1,55 @@
+'''Отправка писем через очередь задач.
+
+С EMAIL_BACKEND = 'jobs.mail.QueuedEmailBackend' письмо, например
+для сброса пароля, только ставится в очередь JOB_EMAIL_QUEUE, а
+отправляет его воркер через JOB_EMAIL_BACKEND. Неудачная отправка
+повторяется как любая задача.
+'''
+import base64
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+
+from .queue import enqueue
+
+FIELDS = ('subject', 'body', 'from_email', 'to', 'cc', 'bcc', 'reply_to',
+          'extra_headers')
+
+
+def serialize(message):
+    '''Письмо в виде, пригодном для JSON'''
+    data = {field: getattr(message, field) for field in FIELDS}
+    data['alternatives'] = list(getattr(message, 'alternatives', []))
+    data['attachments'] = []
+    for attachment in message.attachments:
+        if not isinstance(attachment, tuple):
+            raise TypeError('В очередь ставятся только вложения '
+                            '(имя, содержимое, тип)')
+        filename, content, mimetype = attachment
+        if isinstance(content, str):
+            content = content.encode()
+        data['attachments'].append(
+            [filename, base64.b64encode(content).decode(), mimetype]
+        )
+    return data
+
+
+def deliver(data):
+    '''Задача очереди: отправляет письмо через JOB_EMAIL_BACKEND'''
+    attachments = data.pop('attachments')
+    data['alternatives'] = [tuple(item) for item in data['alternatives']]
+    message = EmailMultiAlternatives(
+        headers=data.pop('extra_headers'), **data
+    )
+    for filename, content, mimetype in attachments:
+        message.attach(filename, base64.b64decode(content), mimetype)
+    get_connection(settings.JOB_EMAIL_BACKEND).send_messages([message])
+
+
+class QueuedEmailBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        for message in email_messages:
+            enqueue(deliver, [serialize(message)],
+                    queue=settings.JOB_EMAIL_QUEUE)
+        return len(email_messages)
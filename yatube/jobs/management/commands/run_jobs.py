@@ -0,0 +1,51 @@
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from jobs.worker import Worker
+
+
+class Command(BaseCommand):
+    help = ('Выполняет задачи из очередей jobs в пуле процессов, '
+            'с повторами и ограничением числа задач на очередь')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--queue', nargs='+', metavar='NAME', dest='queues',
+            help='Очереди из JOB_QUEUES, по умолчанию все',
+        )
+        parser.add_argument(
+            '--processes', type=int, default=settings.JOB_WORKER_PROCESSES,
+            help='Процессов в пуле; 0 выполняет задачи в процессе воркера',
+        )
+        parser.add_argument(
+            '--poll', type=float, default=1.0,
+            help='Пауза в секундах, когда готовых задач нет',
+        )
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='Выйти, когда готовые задачи кончатся',
+        )
+
+    def handle(self, *args, **options):
+        queues = options['queues'] or list(settings.JOB_QUEUES)
+        unknown = set(queues) - set(settings.JOB_QUEUES)
+        if unknown:
+            raise CommandError(f'Нет очередей: {", ".join(sorted(unknown))}')
+        if options['processes'] < 0:
+            raise CommandError('--processes не может быть отрицательным')
+        worker = Worker(queues, options['processes'], options['poll'])
+        # Остановка дожидается начатых задач, новые не берутся
+        previous = {
+            signum: signal.signal(signum, lambda *args: worker.stop())
+            for signum in (signal.SIGINT, signal.SIGTERM)
+        }
+        try:
+            worker.run(burst=options['burst'])
+        finally:
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+        self.stdout.write(
+            f'Выполнено задач: {worker.done}, с ошибкой: {worker.failed}'
+        )
@@ -0,0 +1,66 @@
+import json
+
+from django.db import models
+
+
+class Job(models.Model):
+    '''Отложенный вызов функции task(*args, **kwargs).
+
+    Таблица сама служит брокером: воркер run_jobs забирает задачи
+    со статусом queued, у которых наступил run_at, и задачи running
+    с истёкшей арендой - их воркер умер, не закончив.
+    '''
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Не удалась'),
+    )
+
+    queue = models.CharField(max_length=50, default='default')
+    # Путь для import_string, например posts.feed.fan_out
+    task = models.CharField(max_length=200)
+    # JSON вида {"args": [...], "kwargs": {...}}
+    payload = models.TextField(default='{}')
+    # Повторная постановка с тем же ключом возвращает уже созданную задачу
+    key = models.CharField(max_length=200, unique=True, null=True,
+                           blank=True)
+    status = models.CharField(max_length=10, choices=STATUSES,
+                              default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_at = models.DateTimeField()
+    # Метка воркера, который держит задачу, и срок его аренды
+    claimed_by = models.CharField(max_length=64, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    finished = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'queue', 'run_at'],
+                         name='job_status_queue_run_at_idx'),
+            models.Index(fields=['claimed_by'], name='job_claimed_by_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.task} [{self.status}]'
+
+    @property
+    def arguments(self):
+        data = json.loads(self.payload)
+        return data.get('args', []), data.get('kwargs', {})
+
+
+class QueueLock(models.Model):
+    '''Строка очереди, которую блокирует claim() на время выбора задач'''
+    name = models.CharField(max_length=50, primary_key=True)
+    claimed = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,36 @@
+'''Код процессов пула воркера.
+
+Модуль не трогает модели при импорте: процессы пула запускаются
+через spawn и настраивают Django уже в setup_process().
+'''
+import signal
+import traceback
+
+import django
+from django.db import close_old_connections
+from django.utils.module_loading import import_string
+
+from core.db import primary
+
+
+def setup_process():
+    # Ctrl+C ловит воркер и дожидается начатых задач
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    django.setup()
+
+
+def execute(task, args, kwargs):
+    '''Выполняет задачу, ошибку возвращает текстом трассировки.
+
+    Само исключение может не пережить передачу между процессами.
+    Задача читает из основной базы: реплика могла ещё не получить
+    строки, ради которых задачу поставили.
+    '''
+    try:
+        with primary():
+            import_string(task)(*args, **kwargs)
+    except Exception:
+        return traceback.format_exc()
+    finally:
+        close_old_connections()
+    return None
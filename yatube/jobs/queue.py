@@ -0,0 +1,148 @@
+'''Постановка задач в очередь и учёт их выполнения.
+
+Задача - строка таблицы Job, поэтому она ставится в той же транзакции,
+что и данные, ради которых её ставят, и видна воркеру только после
+коммита. Воркер забирает задачи через claim(), а по итогу вызывает
+complete() или retry().
+'''
+import json
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job, QueueLock
+
+
+def task_path(task):
+    '''Путь для import_string к функции уровня модуля'''
+    if isinstance(task, str):
+        return task
+    path = f'{task.__module__}.{task.__qualname__}'
+    try:
+        found = import_string(path)
+    except ImportError:
+        found = None
+    if found is not task:
+        raise ValueError(f'{path} не импортируется, в очередь ставятся '
+                         'только функции уровня модуля')
+    return path
+
+
+def enqueue(task, args=(), kwargs=None, queue=None, key=None, delay=0,
+            max_attempts=None):
+    '''Ставит вызов task(*args, **kwargs) в очередь.
+
+    Аргументы должны сериализоваться в JSON. Без queue очередь берётся
+    из JOB_ROUTES по пути задачи. Если задача с ключом key уже есть,
+    новая не создаётся и возвращается существующая.
+    '''
+    path = task_path(task)
+    queue = queue or settings.JOB_ROUTES.get(path, 'default')
+    if queue not in settings.JOB_QUEUES:
+        raise ValueError(f'Нет очереди {queue} в JOB_QUEUES')
+    job = Job(
+        queue=queue, task=path, key=key,
+        payload=json.dumps({'args': list(args), 'kwargs': kwargs or {}}),
+        run_at=timezone.now() + timedelta(seconds=delay),
+        max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+    )
+    if key is None:
+        job.save()
+        return job
+    try:
+        with transaction.atomic():
+            job.save()
+    except IntegrityError:
+        return Job.objects.get(key=key)
+    return job
+
+
+def ready(now):
+    '''Задачи, которые можно забрать: пора запускать или аренда истекла'''
+    return (Q(status=Job.QUEUED, run_at__lte=now)
+            | Q(status=Job.RUNNING, locked_until__lte=now))
+
+
+def claim(queue, limit, worker):
+    '''Забирает за воркером до limit готовых задач очереди.
+
+    Вместе с уже выполняющимися задач очереди не больше, чем разрешено
+    в JOB_QUEUES, на всех воркерах сразу: выбор задач идёт под
+    блокировкой строки очереди в QueueLock.
+    '''
+    now = timezone.now()
+    with transaction.atomic():
+        # Транзакция начинается с записи. SQLite сразу берёт блокировку
+        # записи и ждёт её до busy_timeout, а читающая транзакция при
+        # переходе к записи падала бы с database is locked. Остальные
+        # базы держат блокировку строки очереди до коммита
+        if not QueueLock.objects.filter(name=queue).update(claimed=now):
+            QueueLock.objects.create(name=queue, claimed=now)
+        running = Job.objects.filter(
+            queue=queue, status=Job.RUNNING, locked_until__gt=now
+        ).count()
+        limit = min(limit, settings.JOB_QUEUES[queue] - running)
+        if limit <= 0:
+            return []
+        ids = list(Job.objects.filter(ready(now), queue=queue).order_by(
+            'run_at', 'pk'
+        ).values_list('pk', flat=True)[:limit])
+        Job.objects.filter(pk__in=ids).update(
+            status=Job.RUNNING, claimed_by=worker, attempts=F('attempts') + 1,
+            locked_until=now + timedelta(seconds=settings.JOB_LEASE_SECONDS),
+        )
+        return list(Job.objects.filter(pk__in=ids).order_by('run_at', 'pk'))
+
+
+def has_ready(queues):
+    return Job.objects.filter(ready(timezone.now()),
+                              queue__in=queues).exists()
+
+
+def renew(worker):
+    '''Продлевает аренду задач, которые воркер ещё выполняет'''
+    Job.objects.filter(claimed_by=worker, status=Job.RUNNING).update(
+        locked_until=timezone.now()
+        + timedelta(seconds=settings.JOB_LEASE_SECONDS)
+    )
+
+
+def backoff(attempts):
+    '''Пауза перед повтором в секундах: растёт вдвое с каждой попыткой.
+
+    Случайная доля паузы не даёт задачам, упавшим вместе, вместе же
+    и повториться.
+    '''
+    delay = min(settings.JOB_RETRY_DELAY * 2 ** (attempts - 1),
+                settings.JOB_RETRY_MAX_DELAY)
+    return delay * random.uniform(0.5, 1)
+
+
+def _owned(job):
+    return Job.objects.filter(pk=job.pk, claimed_by=job.claimed_by,
+                              status=Job.RUNNING)
+
+
+def complete(job):
+    _owned(job).update(status=Job.DONE, finished=timezone.now(),
+                       locked_until=None, last_error='')
+
+
+def retry(job, error):
+    '''Возвращает задачу в очередь с паузой или, если попытки кончились,
+    помечает её неудавшейся'''
+    now = timezone.now()
+    if job.attempts < job.max_attempts:
+        _owned(job).update(
+            status=Job.QUEUED, claimed_by='', locked_until=None,
+            run_at=now + timedelta(seconds=backoff(job.attempts)),
+            last_error=error,
+        )
+    else:
+        _owned(job).update(status=Job.FAILED, finished=now,
+                           locked_until=None, last_error=error)
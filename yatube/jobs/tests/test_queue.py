@@ -0,0 +1,173 @@
+import io
+import threading
+import time
+from datetime import timedelta
+
+from django.core import mail
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from jobs import queue
+from jobs.models import Job
+from jobs.worker import Worker
+from posts.models import Post, User
+
+CALLS = []
+ACTIVE = {'now': 0, 'max': 0}
+LOCK = threading.Lock()
+
+
+def record(value, suffix=''):
+    CALLS.append(value + suffix)
+
+
+def track(value):
+    '''Запоминает, сколько задач выполнялось одновременно'''
+    with LOCK:
+        ACTIVE['now'] += 1
+        ACTIVE['max'] = max(ACTIVE['max'], ACTIVE['now'])
+    time.sleep(0.005)
+    with LOCK:
+        ACTIVE['now'] -= 1
+    CALLS.append(value)
+
+
+def fail():
+    raise RuntimeError('Задача упала')
+
+
+def run_jobs(processes=0):
+    call_command('run_jobs', burst=True, processes=processes, poll=0,
+                 stdout=io.StringIO())
+
+
+class QueueTests(TestCase):
+    def setUp(self):
+        CALLS.clear()
+
+    def test_job_runs_once_per_key(self):
+        """Задача с одним ключом ставится и выполняется один раз."""
+        first = queue.enqueue(record, ['а'], {'suffix': '!'}, key='once')
+        second = queue.enqueue(record, ['б'], key='once')
+        self.assertEqual(first.pk, second.pk)
+        run_jobs()
+        self.assertEqual(CALLS, ['а!'])
+        self.assertEqual(Job.objects.get().status, Job.DONE)
+
+    def test_enqueue_rejects_bad_tasks(self):
+        with self.assertRaises(ValueError):
+            queue.enqueue(lambda: None)
+        with self.assertRaises(ValueError):
+            queue.enqueue(record, ['а'], queue='нет такой')
+        with self.assertRaises(TypeError):
+            queue.enqueue(record, [object()])
+
+    @override_settings(JOB_RETRY_DELAY=0)
+    def test_failed_job_is_retried_then_failed(self):
+        """Упавшая задача повторяется, пока не кончатся попытки."""
+        job = queue.enqueue(fail, max_attempts=3)
+        run_jobs()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.attempts, 3)
+        self.assertIn('Задача упала', job.last_error)
+
+    def test_backoff_grows(self):
+        with self.settings(JOB_RETRY_DELAY=10, JOB_RETRY_MAX_DELAY=60):
+            self.assertLessEqual(queue.backoff(1), 10)
+            self.assertGreaterEqual(queue.backoff(2), 10)
+            self.assertLessEqual(queue.backoff(10), 60)
+
+    def test_delayed_job_waits(self):
+        queue.enqueue(record, ['а'], delay=60)
+        run_jobs()
+        self.assertEqual(CALLS, [])
+
+    @override_settings(JOB_QUEUES={'default': 1})
+    def test_queue_concurrency_limit(self):
+        """Очередь не отдаёт больше задач, чем разрешено, а задачи
+        с истёкшей арендой забираются заново."""
+        busy = queue.enqueue(record, ['а'])
+        queue.enqueue(record, ['б'])
+        self.assertEqual(queue.claim('default', 5, 'первый'), [busy])
+        self.assertEqual(queue.claim('default', 5, 'второй'), [])
+        Job.objects.filter(pk=busy.pk).update(
+            locked_until=timezone.now() - timedelta(seconds=1)
+        )
+        self.assertEqual(queue.claim('default', 5, 'второй'), [busy])
+
+    @override_settings(
+        EMAIL_BACKEND='jobs.mail.QueuedEmailBackend',
+        JOB_EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    )
+    def test_queued_email(self):
+        """Письмо уходит не сразу, а из очереди email."""
+        message = mail.EmailMultiAlternatives(
+            'Сброс пароля', 'Текст', 'site@example.com', ['user@example.com']
+        )
+        message.attach_alternative('<p>Текст</p>', 'text/html')
+        message.attach('file.txt', 'вложение', 'text/plain')
+        message.send()
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(Job.objects.get().queue, 'email')
+        run_jobs()
+        self.assertEqual(len(mail.outbox), 1)
+        sent = mail.outbox[0]
+        self.assertEqual(sent.subject, 'Сброс пароля')
+        self.assertEqual(sent.alternatives, [('<p>Текст</p>', 'text/html')])
+        self.assertEqual(sent.attachments[0][0], 'file.txt')
+
+    @override_settings(BACKGROUND_JOBS=True)
+    def test_background_work_goes_to_queue(self):
+        """При BACKGROUND_JOBS раскладка поста по лентам ставится
+        в очередь."""
+        author = User.objects.create_user(username='author')
+        post = Post.objects.create(author=author, text='Тестовый пост')
+        job = Job.objects.get(task='posts.feed.fan_out')
+        self.assertEqual(job.arguments, ([post.pk], {}))
+        run_jobs()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE)
+
+    def test_process_pool(self):
+        """Задачи выполняются в пуле процессов, ошибки доходят до базы."""
+        done = queue.enqueue('json.loads', ['{}'])
+        failed = queue.enqueue('json.loads', ['{'], max_attempts=1)
+        run_jobs(processes=1)
+        done.refresh_from_db()
+        failed.refresh_from_db()
+        self.assertEqual(done.status, Job.DONE)
+        self.assertEqual(failed.status, Job.FAILED)
+        self.assertIn('JSONDecodeError', failed.last_error)
+
+
+class ConcurrentWorkersTests(TransactionTestCase):
+    def setUp(self):
+        CALLS.clear()
+        ACTIVE.update(now=0, max=0)
+
+    def run_workers(self, count):
+        def work():
+            try:
+                Worker(['default'], processes=0, poll=0.01).run(burst=True)
+            finally:
+                connection.close()
+        threads = [threading.Thread(target=work) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    @override_settings(JOB_QUEUES={'default': 1})
+    def test_workers_share_queue(self):
+        """Два воркера выполняют каждую задачу один раз и вместе
+        не превышают предел очереди."""
+        for number in range(30):
+            queue.enqueue(track, [str(number)])
+        self.run_workers(2)
+        self.assertEqual(sorted(CALLS, key=int),
+                         [str(number) for number in range(30)])
+        self.assertEqual(ACTIVE['max'], 1)
+        self.assertFalse(Job.objects.exclude(status=Job.DONE).exists())
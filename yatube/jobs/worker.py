@@ -0,0 +1,166 @@
+import logging
+import multiprocessing
+import os
+import random
+import socket
+import time
+import traceback
+import uuid
+from concurrent.futures import (
+    ALL_COMPLETED, FIRST_COMPLETED, ProcessPoolExecutor, wait
+)
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.db import IntegrityError, OperationalError, close_old_connections
+
+from . import queue
+from .process import execute, setup_process
+
+logger = logging.getLogger(__name__)
+
+
+class Worker:
+    '''Забирает задачи из очередей и выполняет их в пуле процессов.
+
+    При processes = 0 задачи выполняются по одной в процессе воркера.
+    '''
+
+    def __init__(self, queues, processes, poll=1.0):
+        self.queues = list(queues)
+        self.processes = processes
+        self.poll = poll
+        self.name = (f'{socket.gethostname()}:{os.getpid()}:'
+                     f'{uuid.uuid4().hex[:8]}')
+        self.running = {}
+        # Итоги задач, ещё не записанные в базу
+        self.results = []
+        self.stopping = False
+        self.broken = False
+        self.renewed = time.monotonic()
+        self.done = self.failed = 0
+
+    def stop(self):
+        self.stopping = True
+
+    def pool(self):
+        if not self.processes:
+            return None
+        return ProcessPoolExecutor(
+            self.processes, mp_context=multiprocessing.get_context('spawn'),
+            initializer=setup_process,
+        )
+
+    def run(self, burst=False):
+        '''Работает до stop(), при burst - пока есть готовые задачи'''
+        pool = self.pool()
+        try:
+            while not self.stopping:
+                try:
+                    claimed = self.step(pool)
+                    if burst and self.idle(claimed):
+                        break
+                except (OperationalError, IntegrityError):
+                    # База занята другим воркером или запросом сайта
+                    logger.warning('Очередь недоступна, повтор', exc_info=True)
+                    self.pause()
+                    continue
+                self.collect(0 if claimed or self.results else self.poll)
+                if self.broken:
+                    # Процесс, погибший посреди задачи, ломает весь пул
+                    pool.shutdown(wait=True)
+                    pool, self.broken = self.pool(), False
+                close_old_connections()
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=True)
+            self.collect(None, ALL_COMPLETED)
+            self.flush()
+
+    def step(self, pool):
+        self.record()
+        self.renew()
+        claimed = self.claim()
+        for job in claimed:
+            self.start(pool, job)
+        return claimed
+
+    def idle(self, claimed):
+        # Задачи, упёршиеся в предел очереди, ждут, пока освободятся
+        # места у других воркеров
+        return (not claimed and not self.running and not self.results
+                and not queue.has_ready(self.queues))
+
+    def pause(self):
+        time.sleep(max(self.poll, 0.05) * random.uniform(0.5, 1.5))
+
+    def flush(self):
+        '''Записывает оставшиеся итоги, пока база не освободится'''
+        while self.results:
+            try:
+                self.record()
+            except (OperationalError, IntegrityError):
+                logger.warning('Итоги не записаны, повтор', exc_info=True)
+                self.pause()
+
+    def claim(self):
+        claimed = []
+        for name in self.queues:
+            free = max(self.processes, 1) - len(self.running) - len(claimed)
+            if free <= 0:
+                break
+            claimed += queue.claim(name, free, self.name)
+        # Следующий круг начинается со следующей очереди
+        self.queues = self.queues[1:] + self.queues[:1]
+        return claimed
+
+    def start(self, pool, job):
+        if job.attempts > job.max_attempts:
+            # Попытки истратили воркеры, которые упали посреди задачи
+            self.finish(job, 'Воркер не завершил задачу')
+            return
+        args, kwargs = job.arguments
+        if pool is None:
+            self.finish(job, execute(job.task, args, kwargs))
+            return
+        try:
+            self.running[pool.submit(execute, job.task, args, kwargs)] = job
+        except BrokenProcessPool:
+            self.broken = True
+            self.finish(job, traceback.format_exc())
+
+    def collect(self, timeout, return_when=FIRST_COMPLETED):
+        if not self.running:
+            if timeout:
+                time.sleep(timeout)
+            return
+        done, _ = wait(self.running, timeout, return_when)
+        for future in done:
+            job = self.running.pop(future)
+            try:
+                error = future.result()
+            except BrokenProcessPool:
+                # Процесс пула погиб, задачи в пуле не выполнены
+                self.broken = True
+                error = traceback.format_exc()
+            self.finish(job, error)
+
+    def renew(self):
+        if (self.running and time.monotonic() - self.renewed
+                > settings.JOB_LEASE_SECONDS / 3):
+            queue.renew(self.name)
+            self.renewed = time.monotonic()
+
+    def finish(self, job, error):
+        self.results.append((job, error))
+
+    def record(self):
+        while self.results:
+            job, error = self.results[0]
+            if error is None:
+                queue.complete(job)
+                self.done += 1
+            else:
+                queue.retry(job, error)
+                self.failed += 1
+            self.results.pop(0)
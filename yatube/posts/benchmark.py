@@ -0,0 +1,196 @@
+'''Замеры времени ответа и числа запросов к базе для страниц posts.urls.
+
+Запросы идут через тестовый клиент Django в одном потоке, поэтому
+замер не зависит от веб-сервера. Страницы, которые пишут в базу,
+выполняются в транзакции с откатом: данные между замерами
+не меняются и прогоны на разных коммитах сравнимы.
+'''
+import math
+import platform
+import subprocess
+import time
+from collections import namedtuple
+from contextlib import ExitStack
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, connections, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.http import urlencode
+
+from .models import AuthorStats, Comment, Follow, Group, Post, User
+
+Case = namedtuple('Case', 'name path client method data write')
+
+
+class Rollback(Exception):
+    pass
+
+
+def percentile(values, percent):
+    '''Перцентиль по ближайшему рангу'''
+    ordered = sorted(values)
+    return ordered[max(math.ceil(len(ordered) * percent / 100) - 1, 0)]
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def dataset():
+    return {
+        'users': User.objects.count(),
+        'groups': Group.objects.count(),
+        'posts': Post.objects.count(),
+        'comments': Comment.objects.count(),
+        'follows': Follow.objects.count(),
+    }
+
+
+def cases():
+    '''Страница posts.urls на самых нагруженных данных базы.
+
+    Берутся самый плодовитый автор, самая большая группа, пост с самым
+    большим числом комментариев и пользователь с самой длинной лентой.
+    '''
+    post = Post.objects.order_by('-comments_count', '-pk').first()
+    group = Group.objects.order_by('-posts_count', '-pk').first()
+    stats = AuthorStats.objects.select_related('author')
+    author = stats.order_by('-posts_count').first()
+    reader = stats.order_by('-following_count').first()
+    if None in (post, group, author, reader):
+        raise ValueError('Для замеров нужны посты, группы и подписки')
+    author, reader = author.author, reader.author
+    followed = Follow.objects.filter(user=reader).values('author')
+    stranger = User.objects.exclude(pk__in=followed).exclude(
+        pk=reader.pk
+    ).first()
+    unfollowed = Follow.objects.filter(user=reader).select_related(
+        'author'
+    ).first()
+    # Без подходящих авторов страницы подписки замеряются вхолостую
+    stranger = stranger or reader
+    unfollowed = unfollowed.author if unfollowed else author
+    words = [word for word in post.text.split() if len(word) > 3]
+    query = words[0] if words else post.text[:10]
+
+    anonymous, reading, owner = Client(), Client(), Client()
+    reading.force_login(reader)
+    owner.force_login(post.author)
+    post_args = {'post_id': post.pk}
+    return [
+        Case('index', reverse('posts:index'), anonymous, 'get', None, False),
+        Case('group_list', reverse('posts:group_list', args=[group.slug]),
+             anonymous, 'get', None, False),
+        Case('profile', reverse('posts:profile', args=[author.username]),
+             anonymous, 'get', None, False),
+        Case('post_detail', reverse('posts:post_detail', kwargs=post_args),
+             anonymous, 'get', None, False),
+        Case('post_create', reverse('posts:post_create'),
+             owner, 'get', None, False),
+        Case('post_edit', reverse('posts:post_edit', kwargs=post_args),
+             owner, 'get', None, False),
+        Case('comments', reverse('posts:comments', kwargs=post_args),
+             anonymous, 'get', None, False),
+        Case('add_comment', reverse('posts:add_comment', kwargs=post_args),
+             reading, 'post', {'text': 'Замер'}, True),
+        Case('follow_index', reverse('posts:follow_index'),
+             reading, 'get', None, False),
+        Case('search', reverse('posts:search') + '?' + urlencode({'q': query}),
+             anonymous, 'get', None, False),
+        Case('profile_follow',
+             reverse('posts:profile_follow', args=[stranger.username]),
+             reading, 'get', None, True),
+        Case('profile_unfollow',
+             reverse('posts:profile_unfollow', args=[unfollowed.username]),
+             reading, 'get', None, True),
+    ]
+
+
+def send(case):
+    request = getattr(case.client, case.method)
+    if not case.write:
+        return request(case.path, case.data)
+    try:
+        with transaction.atomic():
+            response = request(case.path, case.data)
+            raise Rollback
+    except Rollback:
+        return response
+
+
+def measure(case, repeat, cold=False):
+    '''Время ответа в миллисекундах и число запросов к базе'''
+    timings, queries = [], []
+    for _ in range(repeat):
+        if cold:
+            cache.clear()
+        # Чтения могут уйти на реплики, запросы считаются по всем базам
+        with ExitStack() as stack:
+            captured = [
+                stack.enter_context(CaptureQueriesContext(connections[alias]))
+                for alias in connections
+            ]
+            started = time.perf_counter()
+            response = send(case)
+            timings.append((time.perf_counter() - started) * 1000)
+        queries.append(sum(len(context) for context in captured))
+    return {
+        'path': case.path,
+        'status': response.status_code,
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'mean_ms': round(sum(timings) / len(timings), 3),
+        'rps': round(len(timings) * 1000 / sum(timings), 1),
+        'queries': percentile(queries, 50),
+        'max_queries': max(queries),
+    }
+
+
+def run(repeat, warmup=1, cold=False, only=None):
+    results = {}
+    for case in cases():
+        if only and case.name not in only:
+            continue
+        if warmup:
+            measure(case, warmup, cold)
+        results[case.name] = measure(case, repeat, cold)
+    return {
+        'commit': git_commit(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'dataset': dataset(),
+        'repeat': repeat,
+        'cold': cold,
+        'results': results,
+    }
+
+
+def compare(baseline, current):
+    '''Строки с изменением p50 и p99 относительно прошлого прогона'''
+    lines = []
+    for name, result in current['results'].items():
+        before = baseline.get('results', {}).get(name)
+        if before is None:
+            continue
+        changes = [
+            f'{key} {before[key]:.1f} -> {result[key]:.1f} мс '
+            f'({(result[key] / before[key] - 1) * 100:+.0f}%)'
+            for key in ('p50_ms', 'p99_ms') if before[key]
+        ]
+        changes.append(
+            f'запросов {before["queries"]} -> {result["queries"]}'
+        )
+        lines.append(f'{name}: ' + ', '.join(changes))
+    return lines
@@ -0,0 +1,69 @@
+'''Комментарии поста страницами.
+
+Корневые комментарии идут от новых к старым по ключу (created, id),
+следующая страница - ?before=. Ответы на комментарий читаются отдельно
+одним диапазоном по пути (см. Comment.path) и листаются ?after=.
+'''
+from django.urls import reverse
+from django.utils.http import urlencode
+
+from yatube.settings import AMT_COMMENTS
+
+from .models import Comment
+from .utils import CursorPaginator
+
+
+def parse_path(value):
+    return value if value.isdigit() else None
+
+
+class ThreadPaginator(CursorPaginator):
+    '''Ветка ответов по ключу (путь, id) в порядке обхода дерева'''
+
+    parse_value = staticmethod(parse_path)
+
+    def __init__(self, comments, per_page):
+        super().__init__(comments, per_page, date_field='path',
+                         descending=False)
+
+
+def roots(post_id, before=None):
+    paginator = CursorPaginator(
+        Comment.objects.for_stream().filter(
+            post_id=post_id, parent=None
+        ).order_by('-created', '-id'),
+        AMT_COMMENTS, date_field='created',
+    )
+    return paginator.get_page(before)
+
+
+def thread(comment, after=None):
+    paginator = ThreadPaginator(
+        Comment.objects.for_stream().subtree(comment).order_by('path'),
+        AMT_COMMENTS,
+    )
+    return paginator.get_page(after)
+
+
+def next_url(post_id, page_obj, thread_id=None):
+    '''Адрес следующей страницы для подгрузки или None'''
+    if page_obj.next_cursor is None:
+        return None
+    if thread_id is None:
+        query = {'before': page_obj.next_cursor}
+    else:
+        query = {'thread': thread_id, 'after': page_obj.next_cursor}
+    return (reverse('posts:comments', kwargs={'post_id': post_id})
+            + '?' + urlencode(query))
+
+
+def serialize(comment):
+    return {
+        'id': comment.pk,
+        'author': comment.author.username,
+        'text': comment.text,
+        'created': comment.created,
+        'parent': comment.parent_id,
+        'depth': comment.depth,
+        'replies_count': comment.replies_count,
+    }
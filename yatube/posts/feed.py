@@ -0,0 +1,117 @@
+from collections import defaultdict
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import Q
+
+from .models import FeedEntry, Follow, Post, User
+from .utils import CursorPaginator, keyset
+
+BATCH_SIZE = 1000
+
+
+def pulled_authors(user_id):
+    '''Авторы из подписок пользователя, чьи посты читаются при запросе'''
+    return Follow.objects.filter(
+        user_id=user_id,
+        author__stats__followers_count__gte=settings.FEED_PULL_THRESHOLD,
+    ).values_list('author_id', flat=True)
+
+
+def is_pulled(author_id):
+    return User.objects.filter(
+        pk=author_id,
+        stats__followers_count__gte=settings.FEED_PULL_THRESHOLD,
+    ).exists()
+
+
+def _feed_entries(posts):
+    pulled = set(User.objects.filter(
+        pk__in=posts,
+        stats__followers_count__gte=settings.FEED_PULL_THRESHOLD,
+    ).values_list('pk', flat=True))
+    for author_id, author_posts in posts.items():
+        if author_id in pulled:
+            continue
+        followers = Follow.objects.filter(
+            author_id=author_id
+        ).values_list('user_id', flat=True).iterator()
+        for user_id in followers:
+            for post in author_posts:
+                yield FeedEntry(user_id=user_id, post_id=post['pk'],
+                                pub_date=post['pub_date'])
+
+
+def fan_out(*post_ids):
+    '''Раскладывает новые посты по лентам подписчиков их авторов'''
+    posts = defaultdict(list)
+    for post in Post.objects.filter(pk__in=post_ids).values(
+            'pk', 'author_id', 'pub_date'):
+        posts[post['author_id']].append(post)
+    entries = _feed_entries(posts)
+    batch = list(islice(entries, BATCH_SIZE))
+    while batch:
+        FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+        batch = list(islice(entries, BATCH_SIZE))
+
+
+def backfill(user_id, author_id):
+    '''Добавляет в ленту подписчика последние посты нового автора'''
+    if is_pulled(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date'
+    ).values_list('pk', 'pub_date')[:settings.FEED_BACKFILL_SIZE]
+    FeedEntry.objects.bulk_create(
+        [FeedEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+         for pk, pub_date in posts],
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def prune(user_id, author_id):
+    '''Убирает из ленты посты автора, от которого отписались'''
+    FeedEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def feed_posts(user):
+    '''Все посты ленты пользователя одним запросом'''
+    return Post.objects.filter(
+        Q(pk__in=FeedEntry.objects.filter(user=user).values('post_id'))
+        | Q(author__in=pulled_authors(user.pk))
+    )
+
+
+class FeedPaginator(CursorPaginator):
+    '''Курсорная пагинация ленты подписок.
+
+    Страница читается из FeedEntry по индексу (user, pub_date, post)
+    и сливается с постами авторов, которые не раскладываются по лентам.
+    Обе выборки упорядочены по (pub_date, id поста), поэтому курсор
+    у них общий.
+    '''
+
+    def __init__(self, posts, user, per_page, count=None):
+        self.posts = posts
+        self.user = user
+        super().__init__(feed_posts(user), per_page, count=count)
+
+    def _fetch(self, limit, position=None, reverse=False):
+        descending = self.descending != reverse
+        post_ids = keyset(
+            FeedEntry.objects.filter(user=self.user), 'pub_date',
+            descending, position, id_field='post_id'
+        ).values_list('post_id', flat=True)[:limit]
+        items = list(self.posts.filter(pk__in=list(post_ids)).order_by())
+        authors = list(pulled_authors(self.user.pk))
+        if authors:
+            items += keyset(
+                self.posts.filter(author__in=authors), 'pub_date',
+                descending, position
+            )[:limit]
+        unique = {self._key(item): item for item in items}
+        return sorted(unique.values(), key=self._key,
+                      reverse=descending)[:limit]
@@ -1,6 +1,7 @@
 from django import forms
-from django.db import models
+from django.core.files.uploadedfile import UploadedFile
 
+from . import images
 from .models import Post, Comment, Follow
 
 
@@ -19,6 +20,12 @@ class PostForm(forms.ModelForm):
             'image': 'Картинка',
         }
 
+    def clean_image(self):
+        image = self.cleaned_data['image']
+        if isinstance(image, UploadedFile):
+            return images.normalize(image)
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -44,8 +51,3 @@ class FollowForm(forms.ModelForm):
             'user': 'Подписчик',
             'author': 'Автор',
         }
-        constraints = [
-            models.UniqueConstraint(
-                fields=['user', 'author'],
-                name='unique_follow')
-        ]
@@ -0,0 +1,40 @@
+import time
+
+from django.core.cache import cache
+
+
+def _key(scope):
+    return f'generation:{scope}'
+
+
+def _initial():
+    # Номер от времени, а не 1: после вытеснения ключа из кэша старые
+    # фрагменты с прежним номером не оживут.
+    return int(time.time() * 1000)
+
+
+def get_version(*scopes):
+    '''Версия данных для ключа кэша: номера поколений всех scopes'''
+    keys = [_key(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _initial(), None)
+            versions[key] = cache.get(key)
+    return '.'.join(str(versions[key]) for key in keys)
+
+
+def bump(*scopes):
+    '''Сдвигает поколения, делая закэшированные фрагменты устаревшими'''
+    for key in map(_key, scopes):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, _initial(), None)
+
+
+def post_scopes(author_id, group_id):
+    scopes = ['posts', f'author:{author_id}']
+    if group_id is not None:
+        scopes.append(f'group:{group_id}')
+    return scopes
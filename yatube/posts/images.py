@@ -0,0 +1,156 @@
+import io
+import logging
+import os
+import time
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation, ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import features, Image, ImageOps
+from sorl.thumbnail import delete as delete_thumbnails
+
+from .models import Post, Thumbnail
+
+logger = logging.getLogger(__name__)
+
+# Форматы, в которых Pillow умеет сохранять, и расширения их файлов
+VARIANT_FORMATS = {
+    'AVIF': ('avif', 'avif'),
+    'WEBP': ('webp', 'webp'),
+    'JPEG': (None, 'jpg'),
+}
+
+
+def variant_format():
+    '''Самый компактный формат из IMAGE_VARIANT_FORMATS, доступный Pillow'''
+    for name in settings.IMAGE_VARIANT_FORMATS:
+        feature, extension = VARIANT_FORMATS[name]
+        if feature is None or (
+                feature in features.modules
+                and features.check_module(feature)):
+            return name, extension
+    return 'JPEG', 'jpg'
+
+
+def _save(image, image_format):
+    buffer = io.BytesIO()
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    image.save(buffer, format=image_format, quality=85, optimize=True)
+    return buffer.getvalue()
+
+
+def normalize(upload):
+    '''Проверяет размеры картинки и приводит её к виду для хранения.
+
+    Картинка поворачивается по EXIF, метаданные удаляются, стороны
+    уменьшаются до IMAGE_MAX_SIDE. Если ничего из этого не нужно,
+    загрузка возвращается как есть и не перекодируется.
+    '''
+    upload.seek(0)
+    image = Image.open(upload)
+    width, height = image.size
+    if width * height > settings.IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'Картинка слишком большая: %(width)s×%(height)s',
+            code='image_too_large',
+            params={'width': width, 'height': height},
+        )
+    if getattr(image, 'is_animated', False):
+        upload.seek(0)
+        return upload
+    has_exif = bool(image.getexif())
+    image_format = image.format
+    transposed = ImageOps.exif_transpose(image)
+    max_side = settings.IMAGE_MAX_SIDE
+    if not has_exif and max(transposed.size) <= max_side:
+        upload.seek(0)
+        return upload
+    transposed.thumbnail((max_side, max_side), Image.LANCZOS)
+    transposed.info.pop('exif', None)
+    return SimpleUploadedFile(
+        upload.name, _save(transposed, image_format),
+        content_type=Image.MIME.get(image_format, upload.content_type),
+    )
+
+
+def write_variants(name):
+    '''Пишет уменьшенные копии картинки для srcset.
+
+    Возвращает строки «имя ширина» для Post.image_srcset; копии шире
+    оригинала не создаются. Имена копий выводятся из имени картинки,
+    которое задаётся её содержимым, поэтому готовые копии не пишутся
+    повторно.
+    '''
+    with default_storage.open(name) as source:
+        image = Image.open(source)
+        image.load()
+    image_format, extension = variant_format()
+    stem = os.path.splitext(name)[0]
+    variants = []
+    for width in settings.IMAGE_VARIANT_WIDTHS:
+        if width >= image.width:
+            break
+        variant = f'{stem}_{width}w.{extension}'
+        if not default_storage.exists(variant):
+            height = round(image.height * width / image.width)
+            resized = image.resize((width, height), Image.LANCZOS)
+            variant = default_storage.save(
+                variant, ContentFile(_save(resized, image_format))
+            )
+        variants.append(f'{variant} {width}')
+    variants.append(f'{name} {image.width}')
+    return '\n'.join(variants)
+
+
+def srcset(value):
+    '''Значение атрибута srcset из сохранённых строк Post.image_srcset'''
+    candidates = []
+    for line in value.splitlines():
+        name, width = line.rsplit(' ', 1)
+        candidates.append(f'{default_storage.url(name)} {width}w')
+    return ', '.join(candidates)
+
+
+def _delete_copies(name, srcset):
+    Thumbnail.objects.filter(source=name).delete()
+    try:
+        for line in srcset.splitlines():
+            variant = line.rsplit(' ', 1)[0]
+            if variant != name:
+                default_storage.delete(variant)
+        delete_thumbnails(name, delete_file=False)
+    except (OSError, SuspiciousFileOperation):
+        logger.warning('Не удалось удалить копии картинки %s', name)
+
+
+def release(name, srcset='', requested=None, grace=None):
+    '''Удаляет картинку, её копии и миниатюры, если она больше не нужна.
+
+    Файл общий для всех постов с тем же содержимым, поэтому удаляется,
+    только когда на него не ссылается ни один пост и его не загружали
+    заново позже requested - grace (по умолчанию IMAGE_RELEASE_GRACE):
+    загрузка тех же байт могла ещё не дойти до записи поста.
+    '''
+    if not name:
+        return
+    if requested is None:
+        requested = time.time()
+    if grace is None:
+        grace = settings.IMAGE_RELEASE_GRACE
+    storage = Post._meta.get_field('image').storage
+    try:
+        removed = storage.release(name, requested - grace,
+                                  Post.objects.filter(image=name).exists)
+    except (OSError, SuspiciousFileOperation):
+        logger.warning('Не удалось удалить картинку %s', name)
+        return
+    if not removed:
+        return
+    _delete_copies(name, srcset)
+    if storage.exists(name):
+        # Пока удалялись копии, те же байты загрузили снова
+        from . import thumbnails
+        thumbnails.generate(name)
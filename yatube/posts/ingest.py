@@ -0,0 +1,333 @@
+'''Пакетная загрузка постов и комментариев из NDJSON.
+
+Каждая строка потока - JSON-объект одного из видов:
+
+    {"type": "post", "key": "p1", "author": "leo", "text": "...",
+     "group": "cats", "image": "cats/1.jpg", "pub_date": "2020-01-01T12:00"}
+    {"type": "comment", "post": "p1", "author": "leo", "text": "..."}
+
+Обязательны type, author и text. post у комментария - id существующего
+поста или key поста, загруженного раньше в том же потоке. Строки
+проверяются и вставляются пачками, каждая пачка в своей транзакции:
+в SQLite одним executemany (insert_rows), в других базах через
+bulk_create. Ошибочные строки пропускаются и попадают в отчёт
+с номером строки, остальные загружаются.
+
+pub_date и created принимаются, только если загрузка не ограничена
+одним автором (команда ingest_posts, сотрудник в API), и не позже
+текущего момента: иначе пост из будущего висел бы первым в лентах.
+'''
+import json
+import mimetypes
+import os
+from collections import Counter
+
+from django.core.exceptions import SuspiciousFileOperation, ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from django.db import connections, router, transaction
+from django.utils import timezone
+from django.utils._os import safe_join
+from django.utils.dateparse import parse_datetime
+
+from core.background import run_in_background
+
+from . import feed, generations, images, search, thumbnails
+from .models import AuthorStats, Comment, Group, Post, User, root_path
+from .signals import change_counters
+
+CHUNK_SIZE = 1000
+
+
+class RowError(Exception):
+    pass
+
+
+def parse_date(value):
+    '''Дата из ISO 8601, без часового пояса - в поясе проекта'''
+    try:
+        date = parse_datetime(str(value))
+    except ValueError:
+        date = None
+    if date is None:
+        raise RowError(f'Дата не в формате ISO 8601: {value}')
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return date
+
+
+def required_text(row):
+    text = row.get('text')
+    if not isinstance(text, str) or not text.strip():
+        raise RowError('Нужен непустой text')
+    return text
+
+
+def insert_rows(model, objects, date_field):
+    '''Вставка в SQLite одним executemany.
+
+    bulk_create готовит SQL дольше, чем SQLite вставляет строки, и не
+    возвращает id. Вызывается внутри транзакции первой записью в ней:
+    вставка берёт блокировку записи, и до коммита чужих строк в таблице
+    не появится, поэтому наши - последние len(objects) id. Чтение до
+    вставки открыло бы снимок базы, и запись после фоновой задачи,
+    закоммиченной в это время, упала бы с «database is locked».
+    '''
+    connection = connections[router.db_for_write(model)]
+    fields = [field for field in model._meta.concrete_fields
+              if not field.primary_key]
+    now = timezone.now()
+    for obj in objects:
+        setattr(obj, date_field, obj.date or now)
+    quote = connection.ops.quote_name
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        quote(model._meta.db_table),
+        ', '.join(quote(field.column) for field in fields),
+        ', '.join(['%s'] * len(fields)),
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [
+            [field.get_db_prep_save(getattr(obj, field.attname), connection)
+             for field in fields]
+            for obj in objects
+        ])
+    ids = model.objects.order_by('-pk').values_list(
+        'pk', flat=True
+    )[:len(objects)]
+    for obj, pk in zip(objects, reversed(list(ids))):
+        obj.pk = pk
+
+
+class Ingest:
+    '''Загрузка одного потока строк.
+
+    image_root - папка, от которой отсчитываются пути картинок, файлы
+    из неё проверяются и кладутся в хранилище. Без неё image должен
+    быть именем файла, уже лежащего в хранилище. Если задан author,
+    все строки загружаются от его имени.
+    '''
+
+    def __init__(self, image_root=None, author=None, chunk_size=CHUNK_SIZE):
+        self.image_root = image_root
+        self.author = author
+        self.chunk_size = chunk_size
+        self.storage = Post._meta.get_field('image').storage
+        self.keys = {}
+        self.posts = 0
+        self.comments = 0
+        self.errors = []
+
+    def run(self, lines):
+        return self.run_rows(self.parse_lines(lines))
+
+    def parse_lines(self, lines):
+        '''Пары (номер строки, объект), ошибки разбора - в отчёт'''
+        for number, line in enumerate(lines, 1):
+            try:
+                row = self.parse(line)
+            except RowError as exc:
+                self.errors.append((number, str(exc)))
+                continue
+            if row is not None:
+                yield number, row
+
+    def run_rows(self, rows):
+        '''Загружает пары (номер, объект) пачками по chunk_size'''
+        chunk = []
+        for item in rows:
+            chunk.append(item)
+            if len(chunk) == self.chunk_size:
+                self.load(chunk)
+                chunk = []
+        self.load(chunk)
+        self.errors.sort()
+        return self
+
+    def parse(self, line):
+        if isinstance(line, bytes):
+            try:
+                line = line.decode()
+            except UnicodeDecodeError:
+                raise RowError('Строка не в UTF-8')
+        if not line.strip():
+            return None
+        try:
+            row = json.loads(line)
+        except ValueError:
+            raise RowError('Строка не JSON')
+        if not isinstance(row, dict) or row.get('type') not in (
+                'post', 'comment'):
+            raise RowError('Нужен объект с type post или comment')
+        return row
+
+    def load(self, chunk):
+        post_rows = [item for item in chunk if item[1]['type'] == 'post']
+        comment_rows = [item for item in chunk if item[1]['type'] == 'comment']
+        authors = self.lookup(User, 'username', chunk, 'author')
+        groups = self.lookup(Group, 'slug', post_rows, 'group')
+        posts = self.build(post_rows, self.build_post, authors, groups)
+        existing = self.existing_posts(comment_rows)
+        # Транзакция начинается с записи, все чтения - до неё (insert_rows)
+        with transaction.atomic():
+            self.insert(Post, posts, 'pub_date')
+            for post in posts:
+                if post.key is not None:
+                    self.keys[post.key] = post.pk
+            comments = self.build(
+                comment_rows, self.build_comment, authors, existing
+            )
+            self.insert(Comment, comments, 'created')
+            Comment.objects.filter(
+                pk__in=[comment.pk for comment in comments]
+            ).update(path=root_path())
+            self.count(posts, comments)
+            search.index_posts(posts)
+            if posts:
+                run_in_background(feed.fan_out, *[post.pk for post in posts])
+            for name in {post.image.name for post in posts if post.image}:
+                run_in_background(thumbnails.generate, name)
+        self.expire(posts, comments)
+        self.posts += len(posts)
+        self.comments += len(comments)
+
+    def lookup(self, model, field, rows, key):
+        '''{значение поля: pk} для всех значений key в строках пачки'''
+        names = {row[key] for _, row in rows
+                 if isinstance(row.get(key), str)}
+        if not names or (model is User and self.author is not None):
+            return {}
+        return dict(model.objects.filter(
+            **{f'{field}__in': names}
+        ).values_list(field, 'pk'))
+
+    def build(self, rows, build_one, *lookups):
+        objects = []
+        for number, row in rows:
+            try:
+                objects.append(build_one(row, *lookups))
+            except RowError as exc:
+                self.errors.append((number, str(exc)))
+        return objects
+
+    def author_id(self, row, authors):
+        name = row.get('author')
+        if self.author is not None:
+            if name not in (None, self.author.username):
+                raise RowError('Загружать можно только свои записи')
+            return self.author.pk
+        if name not in authors:
+            raise RowError(f'Нет автора {name}')
+        return authors[name]
+
+    def build_post(self, row, authors, groups):
+        post = Post(author_id=self.author_id(row, authors),
+                    text=required_text(row))
+        if row.get('group') is not None:
+            if row['group'] not in groups:
+                raise RowError(f'Нет группы {row["group"]}')
+            post.group_id = groups[row['group']]
+        key = row.get('key')
+        if key is not None and (str(key) in self.keys or key == ''):
+            raise RowError(f'Ключ {key} уже занят')
+        post.key = None if key is None else str(key)
+        post.date = self.date(row, 'pub_date')
+        if row.get('image'):
+            post.image = self.image(row['image'])
+        if post.key is not None:
+            self.keys[post.key] = None
+        return post
+
+    def build_comment(self, row, authors, existing):
+        post = row.get('post')
+        if isinstance(post, str) and self.keys.get(post) is not None:
+            post = self.keys[post]
+        elif type(post) is not int or post not in existing:
+            raise RowError(f'Нет поста {post}')
+        comment = Comment(post_id=post, author_id=self.author_id(row, authors),
+                          text=required_text(row))
+        comment.date = self.date(row, 'created')
+        return comment
+
+    def date(self, row, field):
+        '''Дата строки из поля field, будущие - не позже текущего момента'''
+        if row.get(field) is None:
+            return None
+        if self.author is not None:
+            raise RowError(f'{field} может задавать только сотрудник')
+        return min(parse_date(row[field]), timezone.now())
+
+    def existing_posts(self, rows):
+        ids = {row.get('post') for _, row in rows}
+        ids = [pk for pk in ids if type(pk) is int]
+        return set(Post.objects.filter(pk__in=ids).values_list(
+            'pk', flat=True
+        ))
+
+    def image(self, name):
+        '''Имя картинки в хранилище, при image_root - после загрузки'''
+        if not isinstance(name, str):
+            raise RowError('image должен быть строкой')
+        try:
+            if self.image_root is None:
+                if not self.storage.exists(name):
+                    raise RowError(f'Нет картинки {name}')
+                return name
+            return self.store(safe_join(self.image_root, name))
+        except SuspiciousFileOperation:
+            raise RowError(f'Недопустимый путь {name}')
+        except OSError:
+            raise RowError(f'Не удалось прочитать картинку {name}')
+        except ValidationError as exc:
+            raise RowError(' '.join(exc.messages))
+
+    def store(self, path):
+        name = os.path.basename(path)
+        with open(path, 'rb') as file:
+            upload = UploadedFile(
+                file, name, mimetypes.guess_type(name)[0],
+                os.fstat(file.fileno()).st_size,
+            )
+            upload = images.normalize(upload)
+            field = Post._meta.get_field('image')
+            return self.storage.save(
+                field.generate_filename(None, name), upload
+            )
+
+    def insert(self, model, objects, date_field):
+        '''Вставляет строки, проставляет им id и даты из потока'''
+        if not objects:
+            return
+        if connections[router.db_for_write(model)].vendor == 'sqlite':
+            insert_rows(model, objects, date_field)
+            return
+        # bulk_create перезаписывает дату с auto_now_add
+        model.objects.bulk_create(objects)
+        dated = [obj for obj in objects if obj.date is not None]
+        for obj in dated:
+            setattr(obj, date_field, obj.date)
+        model.objects.bulk_update(dated, [date_field])
+
+    def count(self, posts, comments):
+        '''Хранимые счётчики, которые при save() ведут сигналы'''
+        authors = Counter(post.author_id for post in posts)
+        AuthorStats.objects.bulk_create(
+            [AuthorStats(author_id=pk) for pk in authors],
+            ignore_conflicts=True,
+        )
+        change_counters(AuthorStats, 'posts_count', authors)
+        change_counters(Group, 'posts_count', Counter(
+            post.group_id for post in posts if post.group_id is not None
+        ))
+        change_counters(Post, 'comments_count', Counter(
+            comment.post_id for comment in comments
+        ))
+
+    def expire(self, posts, comments):
+        owners = {(post.author_id, post.group_id) for post in posts}
+        owners.update(Post.objects.filter(
+            pk__in={comment.post_id for comment in comments}
+        ).values_list('author_id', 'group_id').distinct())
+        scopes = set()
+        for author_id, group_id in owners:
+            scopes.update(generations.post_scopes(author_id, group_id))
+        if scopes:
+            generations.bump(*scopes)
@@ -0,0 +1,61 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import benchmark
+
+
+class Command(BaseCommand):
+    help = ('Замеряет p50/p99, пропускную способность и число запросов '
+            'к базе для страниц posts.urls и пишет результат в JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat', type=int, default=50,
+            help='Запросов к каждой странице',
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=3,
+            help='Запросов для прогрева перед замером',
+        )
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кэш перед каждым запросом',
+        )
+        parser.add_argument(
+            '--only', nargs='+', metavar='NAME',
+            help='Замерить только эти страницы',
+        )
+        parser.add_argument(
+            '--output', metavar='FILE',
+            help='Куда записать JSON, по умолчанию в stdout',
+        )
+        parser.add_argument(
+            '--compare', metavar='FILE',
+            help='JSON прошлого прогона для сравнения',
+        )
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat должен быть положительным')
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare'], encoding='utf-8') as file:
+                    baseline = json.load(file)
+            except (OSError, ValueError) as exc:
+                raise CommandError(f'Не удалось прочитать прогон: {exc}')
+        try:
+            report = benchmark.run(options['repeat'], options['warmup'],
+                                   options['cold'], options['only'])
+        except ValueError as exc:
+            raise CommandError(exc)
+        data = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(data + '\n')
+        else:
+            self.stdout.write(data)
+        if baseline is not None:
+            for line in benchmark.compare(baseline, report):
+                self.stderr.write(line)
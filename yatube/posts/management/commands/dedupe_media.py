@@ -0,0 +1,44 @@
+import re
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.management.base import BaseCommand
+
+from posts import images, thumbnails
+from posts.models import Post
+
+HASHED_NAME = re.compile(r'^posts/[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?$')
+
+
+class Command(BaseCommand):
+    help = ('Переносит картинки постов в хранилище по хэшу содержимого, '
+            'одинаковые файлы сливаются в один')
+
+    def handle(self, *args, **options):
+        storage = Post._meta.get_field('image').storage
+        names = Post.objects.exclude(image='').order_by().values_list(
+            'image', flat=True
+        ).distinct()
+        moved = missing = 0
+        for name in [name for name in names if not HASHED_NAME.match(name)]:
+            try:
+                exists = storage.exists(name)
+            except SuspiciousFileOperation:
+                exists = False
+            if not exists:
+                missing += 1
+                self.stderr.write(f'Нет файла {name}')
+                continue
+            with storage.open(name) as content:
+                hashed = storage.save(name, content)
+            posts = Post.objects.filter(image=name)
+            srcset = posts.values_list('image_srcset', flat=True).first()
+            posts.update(image=hashed, image_srcset='')
+            # Старое имя не по хэшу новые загрузки не получат
+            images.release(name, srcset, grace=0)
+            thumbnails.generate(hashed)
+            moved += 1
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{name} -> {hashed}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Перенесено картинок: {moved}, без файла: {missing}'
+        ))
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from posts.models import AuthorStats, Comment, Follow, Group, Post, User
+
+
+def count_of(model, field):
+    '''Подзапрос с количеством строк model, ссылающихся на внешнюю строку'''
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field
+        ).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает хранимые счётчики постов, комментариев и подписок'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            missing = User.objects.filter(stats__isnull=True).values_list(
+                'pk', flat=True
+            )
+            AuthorStats.objects.bulk_create(
+                [AuthorStats(author_id=pk) for pk in missing],
+                batch_size=500
+            )
+            authors = AuthorStats.objects.update(
+                posts_count=count_of(Post, 'author'),
+                followers_count=count_of(Follow, 'author'),
+                following_count=count_of(Follow, 'user'),
+            )
+            groups = Group.objects.update(posts_count=count_of(Post, 'group'))
+            posts = Post.objects.update(
+                comments_count=count_of(Comment, 'post')
+            )
+            Comment.objects.update(replies_count=Coalesce(Subquery(
+                Comment.objects.filter(
+                    post=OuterRef('post'), path__startswith=OuterRef('path')
+                ).exclude(pk=OuterRef('pk')).order_by().values('post')
+                .annotate(total=Count('pk')).values('total')
+            ), 0))
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано: авторов {authors}, групп {groups}, постов {posts}'
+        ))
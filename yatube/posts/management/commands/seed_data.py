@@ -0,0 +1,158 @@
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max
+from django.utils import timezone
+from faker import Faker
+
+from posts.ingest import CHUNK_SIZE, Ingest
+from posts.models import Follow, Group, Post, User
+
+# Столько разных текстов генерирует Faker, посты собираются из них
+TEXT_POOL = 2000
+PERIOD = timedelta(days=365)
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу синтетическими пользователями, группами, '
+            'подписками, постами и комментариями для замеров')
+
+    def add_arguments(self, parser):
+        for name, default, help_text in (
+            ('users', 1000, 'Новых пользователей'),
+            ('groups', 20, 'Новых групп'),
+            ('posts', 10000, 'Новых постов'),
+            ('comments', 20000, 'Новых комментариев'),
+            ('follows', 20, 'Подписок у пользователя в среднем'),
+            ('seed', 0, 'Зерно генератора для повторяемых данных'),
+            ('chunk-size', CHUNK_SIZE, 'Строк в одной транзакции'),
+        ):
+            parser.add_argument(f'--{name}', type=int, default=default,
+                                help=help_text)
+        parser.add_argument(
+            '--alpha', type=float, default=1.1,
+            help='Показатель степенного закона популярности авторов',
+        )
+
+    def handle(self, *args, **options):
+        if options['users'] < 2:
+            raise CommandError('Нужно хотя бы два пользователя')
+        self.rng = random.Random(options['seed'])
+        self.fake = Faker('ru_RU')
+        self.fake.seed_instance(options['seed'])
+        self.chunk_size = options['chunk_size']
+        started = time.monotonic()
+        users = self.create_users(options['users'])
+        groups = self.create_groups(options['groups'])
+        # Вес автора с рангом r пропорционален r^-alpha
+        self.rng.shuffle(users)
+        weights = [rank ** -options['alpha']
+                   for rank in range(1, len(users) + 1)]
+        follows = self.create_follows(users, weights, options['follows'])
+        call_command('rebuild_counters', stdout=self.stdout)
+        self.rng.shuffle(users)
+        texts = [self.fake.paragraph(nb_sentences=self.rng.randint(1, 6))
+                 for _ in range(TEXT_POOL)]
+        posts = self.create_posts(
+            options['posts'], users, weights, groups, texts
+        )
+        comments = self.create_comments(options['comments'], users, texts)
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано: пользователей {len(users)}, групп {len(groups)}, '
+            f'подписок {follows}, постов {posts}, комментариев {comments} '
+            f'за {time.monotonic() - started:.1f} с'
+        ))
+
+    def chunks(self, items):
+        for start in range(0, len(items), self.chunk_size):
+            yield items[start:start + self.chunk_size]
+
+    def create_users(self, total):
+        first = (User.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+        password = make_password(None)
+        names = []
+        for chunk in self.chunks(range(first, first + total)):
+            batch = [User(username=f'seed{number}', password=password,
+                          first_name=self.fake.first_name(),
+                          last_name=self.fake.last_name())
+                     for number in chunk]
+            User.objects.bulk_create(batch, ignore_conflicts=True)
+            names += [user.username for user in batch]
+        return names
+
+    def create_groups(self, total):
+        first = (Group.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+        groups = [Group(title=self.fake.word().capitalize(),
+                        slug=f'seed-{number}',
+                        description=self.fake.sentence())
+                  for number in range(first, first + total)]
+        Group.objects.bulk_create(groups, ignore_conflicts=True)
+        return [group.slug for group in groups]
+
+    def create_follows(self, users, weights, average):
+        '''Подписки со степенным распределением популярности авторов'''
+        ids = {}
+        for chunk in self.chunks(users):
+            ids.update(User.objects.filter(username__in=chunk).values_list(
+                'username', 'pk'
+            ))
+        authors = [ids[name] for name in users]
+        cum_weights, total = [], 0
+        for weight in weights:
+            total += weight
+            cum_weights.append(total)
+        created, batch = 0, []
+        for user_id in authors:
+            count = min(int(self.rng.expovariate(1 / average)) if average
+                        else 0, len(authors) - 1)
+            targets = set(self.rng.choices(
+                authors, cum_weights=cum_weights, k=count
+            ))
+            targets.discard(user_id)
+            batch += [Follow(user_id=user_id, author_id=author_id)
+                      for author_id in targets]
+            if len(batch) >= self.chunk_size:
+                Follow.objects.bulk_create(batch, ignore_conflicts=True)
+                created, batch = created + len(batch), []
+        Follow.objects.bulk_create(batch, ignore_conflicts=True)
+        return created + len(batch)
+
+    def random_date(self):
+        return timezone.now() - PERIOD * self.rng.random()
+
+    def create_posts(self, total, users, weights, groups, texts):
+        def rows():
+            authors = self.rng.choices(users, weights=weights, k=total)
+            for number, author in enumerate(authors, 1):
+                row = {'type': 'post', 'author': author,
+                       'text': self.rng.choice(texts),
+                       'pub_date': self.random_date()}
+                if groups and self.rng.random() < 0.7:
+                    row['group'] = self.rng.choice(groups)
+                yield number, row
+        return self.ingest(rows())
+
+    def create_comments(self, total, users, texts):
+        posts = list(Post.objects.order_by().values_list('pk', flat=True))
+        if not posts:
+            return 0
+
+        def rows():
+            for number in range(1, total + 1):
+                yield number, {
+                    'type': 'comment', 'post': self.rng.choice(posts),
+                    'author': self.rng.choice(users),
+                    'text': self.rng.choice(texts)[:200],
+                    'created': self.random_date(),
+                }
+        return self.ingest(rows())
+
+    def ingest(self, rows):
+        result = Ingest(chunk_size=self.chunk_size).run_rows(rows)
+        for number, message in result.errors[:10]:
+            self.stderr.write(f'Строка {number}: {message}')
+        return result.posts + result.comments
@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post, Thumbnail
+
+
+class Command(BaseCommand):
+    help = 'Создаёт миниатюры и копии картинок постов, которых нет в индексе'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Пересоздать миниатюры для всех картинок',
+        )
+
+    def handle(self, *args, **options):
+        images = Post.objects.exclude(image='').order_by().values_list(
+            'image', flat=True
+        ).distinct()
+        if options['all']:
+            names = set(images)
+        else:
+            names = set()
+            for rendition in settings.THUMBNAIL_RENDITIONS:
+                geometry, serialized = thumbnails.rendition_key(rendition)
+                ready = Thumbnail.objects.filter(
+                    geometry=geometry, options=serialized
+                ).values('source')
+                names.update(images.exclude(image__in=ready))
+        for number, name in enumerate(sorted(names), 1):
+            thumbnails.generate(name)
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{number}/{len(names)} {name}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано картинок: {len(names)}'
+        ))
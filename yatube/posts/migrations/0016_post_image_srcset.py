@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_follow_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='image_srcset',
+            field=models.TextField(blank=True, editable=False),
+        ),
+    ]
@@ -0,0 +1,48 @@
+from django.db import migrations
+
+SQLITE_CREATE = (
+    'CREATE VIRTUAL TABLE posts_post_search USING fts5('
+    'body, tokenize="unicode61 remove_diacritics 2")'
+)
+POSTGRES_CREATE = [
+    "ALTER TABLE posts_post ADD COLUMN search_vector tsvector "
+    "GENERATED ALWAYS AS (to_tsvector('russian', text)) STORED",
+    'CREATE INDEX post_search_vector_idx ON posts_post '
+    'USING GIN (search_vector)',
+]
+
+
+def create_index(apps, schema_editor):
+    '''Полнотекстовый индекс: FTS5 в SQLite, tsvector в PostgreSQL.
+
+    Таблица FTS5 создаётся пустой: заполняет её сигнал post_migrate
+    posts.signals.build_search_index, чтобы миграция не зависела от
+    того, как стеммер разбирает текст сейчас.
+    '''
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        for sql in POSTGRES_CREATE:
+            schema_editor.execute(sql)
+    elif vendor == 'sqlite':
+        schema_editor.execute(SQLITE_CREATE)
+
+
+def drop_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'ALTER TABLE posts_post DROP COLUMN search_vector'
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE posts_post_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_content_addressed_images'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
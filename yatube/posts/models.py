@@ -1,5 +1,9 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Cast, LPad
+
+from .storage import ContentAddressedStorage
 
 User = get_user_model()
 
@@ -8,11 +12,27 @@ class Group(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
     description = models.TextField()
+    posts_count = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def for_listing(self):
+        '''Посты для лент: связанные строки одним JOIN, без лишних полей'''
+        return self.select_related('author', 'group').only(
+            'id', 'text', 'pub_date', 'image', 'comments_count',
+            'author_id', 'group_id',
+            'author__username', 'author__first_name', 'author__last_name',
+            'group__title', 'group__slug',
+        )
+
+    def for_detail(self):
+        '''Пост со счётчиками автора; комментарии читаются страницами'''
+        return self.select_related('author__stats', 'group')
+
+
 class Post(models.Model):
     text = models.TextField()
     pub_date = models.DateTimeField(auto_now_add=True)
@@ -31,16 +51,77 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True
     )
+    # Строки «имя ширина» уменьшенных копий картинки для srcset
+    image_srcset = models.TextField(blank=True, editable=False)
+    comments_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_pub_date_idx'),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx'),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx'),
+            models.Index(fields=['image'], name='post_image_idx'),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
 
+# Ширина номера комментария в пути: путь - номера всех предков
+# и самого комментария подряд, поэтому сортировка по пути даёт порядок
+# обхода дерева, а поддерево - один диапазон строк
+PATH_WIDTH = 10
+
+
+def path_segment(pk):
+    return f'{pk:0{PATH_WIDTH}d}'
+
+
+def path_ids(path):
+    '''id комментариев, из которых состоит путь'''
+    return [int(path[start:start + PATH_WIDTH])
+            for start in range(0, len(path), PATH_WIDTH)]
+
+
+def root_path():
+    '''Выражение для update(): путь корневого комментария из его id'''
+    return LPad(Cast('id', models.CharField(max_length=PATH_WIDTH)),
+                PATH_WIDTH, models.Value('0'))
+
+
+def subtree_end(path):
+    '''Первый путь после поддерева: путь из одних цифр плюс единица'''
+    return f'{int(path) + 1:0{len(path)}d}'
+
+
+class CommentQuerySet(models.QuerySet):
+    def for_stream(self):
+        return self.select_related('author').only(
+            'id', 'text', 'created', 'post_id', 'parent_id', 'path',
+            'replies_count', 'author_id', 'author__username',
+        )
+
+    def subtree(self, comment):
+        '''Ответы на комментарий на любой глубине, в порядке обхода дерева'''
+        return self.filter(
+            post_id=comment.post_id,
+            path__gt=comment.path,
+            path__lt=subtree_end(comment.path),
+        )
+
+
 class Comment(models.Model):
     text = models.TextField()
     created = models.DateTimeField(auto_now_add=True)
@@ -54,6 +135,68 @@ class Comment(models.Model):
         on_delete=models.CASCADE,
         related_name='comments'
     )
+    parent = models.ForeignKey(
+        'self',
+        blank=True,
+        null=True,
+        on_delete=models.CASCADE,
+        related_name='replies'
+    )
+    path = models.CharField(max_length=255, editable=False, default='')
+    # Ответов на любой глубине, ведётся сигналами posts.signals
+    replies_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = CommentQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['post', 'created', 'id'],
+                name='comment_post_created_idx'),
+            models.Index(
+                fields=['post', '-created', '-id'],
+                name='comment_root_created_idx',
+                condition=models.Q(parent__isnull=True)),
+            models.Index(
+                fields=['post', 'path'],
+                name='comment_post_path_idx'),
+        ]
+
+    @property
+    def depth(self):
+        return max(len(self.path) // PATH_WIDTH - 1, 0)
+
+    @property
+    def ancestor_ids(self):
+        return path_ids(self.path)[:-1]
+
+    def save(self, *args, **kwargs):
+        '''Новому комментарию после вставки дописывается путь.
+
+        Вставка и путь пишутся в одной транзакции: иначе ответ на новый
+        комментарий мог бы прочитать его ещё с пустым путём. Ответ
+        глубже COMMENT_MAX_DEPTH прикрепляется к предку на последнем
+        допустимом уровне.
+        '''
+        if self.pk is not None:
+            super().save(*args, **kwargs)
+            return
+        prefix = ''
+        if self.parent_id is not None:
+            if not self.parent.path:
+                self.parent.refresh_from_db(fields=['path'])
+            if not self.parent.path:
+                raise ValueError(
+                    f'У комментария {self.parent_id} ещё нет пути'
+                )
+            prefix = self.parent.path[
+                :(settings.COMMENT_MAX_DEPTH - 1) * PATH_WIDTH
+            ]
+            self.parent_id = int(prefix[-PATH_WIDTH:])
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+            self.path = prefix + path_segment(self.pk)
+            Comment.objects.filter(pk=self.pk).update(path=self.path)
 
 
 class Follow(models.Model):
@@ -67,3 +210,67 @@ class Follow(models.Model):
         on_delete=models.CASCADE,
         related_name='following'
     )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'],
+                name='unique_follow')
+        ]
+
+
+class AuthorStats(models.Model):
+    '''Счётчики автора, которые обновляются сигналами posts.signals'''
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats'
+    )
+    posts_count = models.PositiveIntegerField(default=0)
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+
+
+class FeedEntry(models.Model):
+    '''Пост в материализованной ленте подписок пользователя'''
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_entries'
+    )
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_feed_entry')
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='feed_user_pub_date_idx')
+        ]
+
+
+class Thumbnail(models.Model):
+    '''Готовая миниатюра картинки для заданных геометрии и опций'''
+    source = models.CharField(max_length=100)
+    geometry = models.CharField(max_length=50)
+    options = models.CharField(max_length=255)
+    name = models.CharField(max_length=255)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['source', 'geometry', 'options'],
+                name='unique_thumbnail')
+        ]
@@ -0,0 +1,33 @@
+from . import generations
+from .models import Group, Post, User
+
+
+def index_state(request):
+    return generations.get_version('posts')
+
+
+def group_state(request, slug):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        'pk', flat=True
+    ).first()
+    if group_id is None:
+        return None
+    return generations.get_version(f'group:{group_id}')
+
+
+def profile_state(request, username):
+    author_id = User.objects.filter(username=username).values_list(
+        'pk', flat=True
+    ).first()
+    if author_id is None:
+        return None
+    return generations.get_version(f'author:{author_id}')
+
+
+def post_detail_state(request, post_id):
+    author_id = Post.objects.filter(pk=post_id).values_list(
+        'author_id', flat=True
+    ).first()
+    if author_id is None:
+        return None
+    return generations.get_version(f'author:{author_id}')
@@ -0,0 +1,162 @@
+import math
+import re
+
+from django.db import connections, router
+from django.utils.functional import cached_property
+
+from .models import Post
+from .stemmer import stem
+from .utils import CursorPaginator
+
+TABLE = 'posts_post_search'
+BATCH_SIZE = 1000
+WORD = re.compile(r'\w+')
+
+# Ранг отрицательный в обоих вариантах: чем меньше, тем выше в выдаче
+SQLITE_SCORE = f'bm25({TABLE})'
+SQLITE_SEARCH = (
+    f'SELECT rowid, {SQLITE_SCORE} FROM {TABLE} '
+    f'WHERE {TABLE} MATCH %s'
+)
+POSTGRES_SCORE = "-ts_rank_cd(search_vector, plainto_tsquery('russian', %s))"
+POSTGRES_SEARCH = (
+    f'SELECT id, {POSTGRES_SCORE} FROM posts_post '
+    "WHERE search_vector @@ plainto_tsquery('russian', %s)"
+)
+
+
+def stems(text):
+    return [stem(word) for word in WORD.findall(text.lower())]
+
+
+def index_text(text):
+    '''Текст поста в виде основ слов для индекса FTS5'''
+    return ' '.join(stems(text))
+
+
+def match_query(query):
+    '''Запрос FTS5: все основы слов запроса, каждая в кавычках'''
+    return ' '.join(f'"{word}"' for word in stems(query))
+
+
+def _vendor():
+    return connections[Post.objects.db].vendor
+
+
+def _writer():
+    '''Соединение для записи в индекс: реплики только читают'''
+    return connections[router.db_for_write(Post)]
+
+
+def index_posts(posts):
+    '''Добавляет или обновляет посты в индексе SQLite.
+
+    В PostgreSQL индекс - вычисляемый столбец search_vector, его база
+    обновляет сама.
+    '''
+    if _vendor() != 'sqlite':
+        return
+    rows = [(post.pk, index_text(post.text)) for post in posts]
+    with _writer().cursor() as cursor:
+        cursor.executemany(
+            f'DELETE FROM {TABLE} WHERE rowid = %s',
+            [(pk,) for pk, _ in rows],
+        )
+        cursor.executemany(
+            f'INSERT INTO {TABLE} (rowid, body) VALUES (%s, %s)', rows
+        )
+
+
+def unindex_post(post_id):
+    if _vendor() != 'sqlite':
+        return
+    with _writer().cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [post_id])
+
+
+def rebuild():
+    '''Заново строит индекс SQLite по всем постам, возвращает их число'''
+    if _vendor() != 'sqlite':
+        return Post.objects.count()
+    with _writer().cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+    total, batch = 0, []
+    for post in Post.objects.only('id', 'text').order_by().iterator():
+        batch.append(post)
+        if len(batch) == BATCH_SIZE:
+            index_posts(batch)
+            total += len(batch)
+            batch = []
+    index_posts(batch)
+    return total + len(batch)
+
+
+def search(query, limit, position=None, reverse=False):
+    '''Пары (id поста, ранг) по запросу в порядке (ранг, id).
+
+    position - (ранг, id) последнего показанного поста, выдача
+    продолжается после него, при reverse - в обратную сторону.
+    '''
+    if _vendor() == 'postgresql':
+        sql, score, params = POSTGRES_SEARCH, POSTGRES_SCORE, [query, query]
+        score_params, key = [query], 'id'
+    else:
+        query = match_query(query)
+        if not query:
+            return []
+        sql, score, params = SQLITE_SEARCH, SQLITE_SCORE, [query]
+        score_params, key = [], 'rowid'
+    after, order = ('<', 'DESC') if reverse else ('>', 'ASC')
+    if position is not None:
+        value, pk = position
+        sql += (f' AND ({score} {after} %s'
+                f' OR ({score} = %s AND {key} {after} %s))')
+        params += [*score_params, value, *score_params, value, pk]
+    sql += f' ORDER BY 2 {order}, 1 {order} LIMIT %s'
+    with connections[Post.objects.db].cursor() as cursor:
+        cursor.execute(sql, params + [limit])
+        return cursor.fetchall()
+
+
+def count_matches(query):
+    if _vendor() == 'postgresql':
+        sql = ('SELECT count(*) FROM posts_post '
+               "WHERE search_vector @@ plainto_tsquery('russian', %s)")
+    else:
+        query = match_query(query)
+        if not query:
+            return 0
+        sql = f'SELECT count(*) FROM {TABLE} WHERE {TABLE} MATCH %s'
+    with connections[Post.objects.db].cursor() as cursor:
+        cursor.execute(sql, [query])
+        return cursor.fetchone()[0]
+
+
+def parse_score(value):
+    score = float(value)
+    return score if math.isfinite(score) else None
+
+
+class SearchPaginator(CursorPaginator):
+    '''Курсорная пагинация выдачи поиска по ключу (ранг, id)'''
+
+    parse_value = staticmethod(parse_score)
+
+    def __init__(self, posts, query, per_page):
+        self.query = query
+        super().__init__(posts, per_page, date_field='search_score',
+                         descending=False)
+
+    @cached_property
+    def count(self):
+        return count_matches(self.query)
+
+    def _fetch(self, limit, position=None, reverse=False):
+        hits = search(self.query, limit, position, reverse)
+        posts = self.object_list.in_bulk([pk for pk, _ in hits])
+        items = []
+        for pk, score in hits:
+            if pk in posts:
+                posts[pk].search_score = score
+                items.append(posts[pk])
+        return items
@@ -0,0 +1,310 @@
+import time
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import (
+    post_delete, post_migrate, post_save, pre_save
+)
+from django.dispatch import receiver
+
+from core.background import run_in_background
+
+from . import feed, generations, images, search, thumbnails
+from .models import (
+    AuthorStats, Comment, Follow, Group, Post, User, path_ids
+)
+
+# Поля автора и группы, которые видны на страницах с постами
+SHOWN_USER_FIELDS = ('username', 'first_name', 'last_name')
+SHOWN_GROUP_FIELDS = ('title', 'slug', 'description')
+# Миграция, создающая таблицу полнотекстового индекса
+SEARCH_MIGRATION = '0019_post_search'
+
+
+def change_counter(queryset, field, delta):
+    '''Атомарно сдвигает счётчик на delta через F(), не уходя ниже нуля'''
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    queryset.update(**{field: F(field) + delta})
+
+
+def change_counters(model, field, deltas):
+    '''Сдвигает счётчик у многих строк сразу, deltas - {pk: сдвиг}.
+
+    Строки с одинаковым сдвигом обновляются одним запросом.
+    '''
+    groups = defaultdict(list)
+    for pk, delta in deltas.items():
+        groups[delta].append(pk)
+    for delta, pks in groups.items():
+        change_counter(model.objects.filter(pk__in=pks), field, delta)
+
+
+def change_author_stats(author_id, field, delta):
+    if delta > 0:
+        AuthorStats.objects.get_or_create(author_id=author_id)
+    change_counter(
+        AuthorStats.objects.filter(author_id=author_id), field, delta
+    )
+
+
+def change_author_posts(author_id, delta):
+    change_author_stats(author_id, 'posts_count', delta)
+
+
+def change_group_posts(group_id, delta):
+    if group_id is not None:
+        change_counter(
+            Group.objects.filter(pk=group_id), 'posts_count', delta
+        )
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_state(sender, instance, **kwargs):
+    '''Запоминает автора, группу и картинку поста до сохранения правки'''
+    instance._previous = None
+    if instance.pk is not None:
+        instance._previous = Post.objects.filter(pk=instance.pk).values(
+            'author_id', 'group_id', 'image', 'image_srcset'
+        ).first()
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous', None)
+    if created or previous is None:
+        change_author_posts(instance.author_id, 1)
+        change_group_posts(instance.group_id, 1)
+        return
+    author_id, group_id = previous['author_id'], previous['group_id']
+    if author_id != instance.author_id:
+        change_author_posts(author_id, -1)
+        change_author_posts(instance.author_id, 1)
+    if group_id != instance.group_id:
+        change_group_posts(group_id, -1)
+        change_group_posts(instance.group_id, 1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    change_author_posts(instance.author_id, -1)
+    change_group_posts(instance.group_id, -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        change_counter(
+            Post.objects.filter(pk=instance.post_id), 'comments_count', 1
+        )
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    change_counter(
+        Post.objects.filter(pk=instance.post_id), 'comments_count', -1
+    )
+
+
+@receiver(post_save, sender=Comment)
+def count_saved_reply(sender, instance, created, raw=False, **kwargs):
+    '''Ответ прибавляется к счётчикам всех предков'''
+    if created and not raw and instance.parent_id is not None:
+        change_counter(
+            Comment.objects.filter(pk__in=path_ids(instance.parent.path)),
+            'replies_count', 1
+        )
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_reply(sender, instance, **kwargs):
+    change_counter(
+        Comment.objects.filter(pk__in=instance.ancestor_ids),
+        'replies_count', -1
+    )
+
+
+@receiver(post_save, sender=Follow)
+def count_saved_follow(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        change_author_stats(instance.author_id, 'followers_count', 1)
+        change_author_stats(instance.user_id, 'following_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    change_author_stats(instance.author_id, 'followers_count', -1)
+    change_author_stats(instance.user_id, 'following_count', -1)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        run_in_background(feed.fan_out, instance.pk)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_feed(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        feed.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_feed(sender, instance, **kwargs):
+    feed.prune(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def expire_post_pages(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    scopes = generations.post_scopes(instance.author_id, instance.group_id)
+    previous = getattr(instance, '_previous', None)
+    if previous is not None:
+        scopes += generations.post_scopes(
+            previous['author_id'], previous['group_id']
+        )
+    generations.bump(*set(scopes))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def expire_comment_pages(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    owner = Post.objects.filter(pk=instance.post_id).values_list(
+        'author_id', 'group_id'
+    ).first()
+    if owner is not None:
+        generations.bump(*generations.post_scopes(*owner))
+
+
+def shown_fields_changed(instance, fields, update_fields):
+    '''Меняет ли сохранение что-то из fields у существующей строки'''
+    if instance.pk is None:
+        return False
+    if update_fields is not None and not set(fields) & set(update_fields):
+        return False
+    previous = type(instance).objects.filter(pk=instance.pk).values(
+        *fields
+    ).first()
+    return previous is not None and any(
+        previous[field] != getattr(instance, field) for field in fields
+    )
+
+
+@receiver(pre_save, sender=User)
+def remember_user_state(sender, instance, raw=False, update_fields=None,
+                        **kwargs):
+    # Вход в систему сохраняет только last_login и ничего не сбрасывает
+    instance._shown_changed = not raw and shown_fields_changed(
+        instance, SHOWN_USER_FIELDS, update_fields
+    )
+
+
+@receiver(post_save, sender=User)
+def expire_user_pages(sender, instance, **kwargs):
+    '''Имя автора есть на его постах во всех лентах и у его комментариев
+    под чужими постами'''
+    if not getattr(instance, '_shown_changed', False):
+        return
+    groups = Post.objects.filter(
+        author=instance, group__isnull=False
+    ).values_list('group_id', flat=True).distinct()
+    authors = Comment.objects.filter(author=instance).values_list(
+        'post__author_id', flat=True
+    ).distinct()
+    generations.bump('posts', f'author:{instance.pk}',
+                     *{f'group:{pk}' for pk in groups},
+                     *{f'author:{pk}' for pk in authors})
+
+
+@receiver(pre_save, sender=Group)
+def remember_group_state(sender, instance, raw=False, update_fields=None,
+                         **kwargs):
+    instance._shown_changed = not raw and shown_fields_changed(
+        instance, SHOWN_GROUP_FIELDS, update_fields
+    )
+
+
+@receiver(post_save, sender=Group)
+def expire_group_pages(sender, instance, **kwargs):
+    '''Название группы есть на её странице и в карточках её постов'''
+    if not getattr(instance, '_shown_changed', False):
+        return
+    authors = Post.objects.filter(group=instance).values_list(
+        'author_id', flat=True
+    ).distinct()
+    generations.bump('posts', f'group:{instance.pk}',
+                     *{f'author:{pk}' for pk in authors})
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def expire_feed_pages(sender, instance, raw=False, **kwargs):
+    if not raw:
+        generations.bump(f'feed:{instance.user_id}')
+
+
+@receiver(post_save, sender=Post)
+def queue_thumbnails(sender, instance, created, raw=False, **kwargs):
+    if raw or not instance.image:
+        return
+    previous = getattr(instance, '_previous', None)
+    if previous is None or previous['image'] != instance.image.name:
+        run_in_background(thumbnails.generate, instance.image.name)
+
+
+@receiver(post_save, sender=Post)
+def release_replaced_image(sender, instance, raw=False, **kwargs):
+    previous = getattr(instance, '_previous', None)
+    if (not raw and previous is not None
+            and previous['image'] != instance.image.name):
+        run_in_background(
+            images.release, previous['image'], previous['image_srcset'],
+            time.time(),
+        )
+
+
+@receiver(post_delete, sender=Post)
+def release_deleted_image(sender, instance, **kwargs):
+    if instance.image:
+        run_in_background(
+            images.release, instance.image.name, instance.image_srcset,
+            time.time(),
+        )
+
+
+@receiver(post_save, sender=Post)
+def index_saved_post(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_posts([instance])
+
+
+@receiver(post_delete, sender=Post)
+def unindex_deleted_post(sender, instance, **kwargs):
+    search.unindex_post(instance.pk)
+
+
+@receiver(post_migrate)
+def build_search_index(sender, app_config, plan=None, using='default',
+                       **kwargs):
+    '''Строит индекс после миграции, которая создала его таблицу.
+
+    Сама миграция не импортирует стеммер: его правки не должны менять
+    уже применённые миграции, а индекс всегда строится текущим кодом.
+    '''
+    if app_config.name != 'posts' or not plan:
+        return
+    created = any(
+        migration.app_label == 'posts'
+        and migration.name == SEARCH_MIGRATION and not backwards
+        for migration, backwards in plan
+    )
+    if created:
+        with transaction.atomic(using=using):
+            search.rebuild()
@@ -0,0 +1,119 @@
+'''Стеммер Портера (Snowball) для русского языка.
+
+Нужен полнотекстовому поиску на SQLite: у FTS5 нет русской
+морфологии, поэтому в индекс и в запрос попадают уже основы слов.
+'''
+import re
+from functools import lru_cache
+
+VOWELS = 'аеиоуыэюя'
+
+
+def _endings(*groups):
+    '''Длины окончаний группы по убыванию и словарь окончаний.
+
+    Группа задаётся парой (окончания, нужна ли перед ними а/я). Словарь
+    даёт для каждой длины одну проверку вместо перебора всех окончаний.
+    '''
+    endings = {ending: after_a for words, after_a in groups
+               for ending in words.split()}
+    return sorted({len(ending) for ending in endings}, reverse=True), endings
+
+
+PERFECTIVE_GERUND = _endings(
+    ('в вши вшись', True),
+    ('ив ивши ившись ыв ывши ывшись', False),
+)
+ADJECTIVE = _endings((
+    'ее ие ые ое ими ыми ей ий ый ой ем им ым ом его ого ему ому '
+    'их ых ую юю ая яя ою ею', False
+))
+PARTICIPLE = _endings(
+    ('ем нн вш ющ щ', True),
+    ('ивш ывш ующ', False),
+)
+REFLEXIVE = _endings(('ся сь', False))
+VERB = _endings(
+    ('ла на ете йте ли й л ем н ло но ет ют ны ть ешь нно', True),
+    ('ила ыла ена ейте уйте ите или ыли ей уй ил ыл им ым ен ило ыло '
+     'ено ят ует уют ит ыт ены ить ыть ишь ую ю', False),
+)
+NOUN = _endings((
+    'а ев ов ие ье е иями ями ами еи ии и ией ей ой ий й иям ям ием ем '
+    'ам ом о у ах иях ях ы ь ию ью ю ия ья я', False
+))
+SUPERLATIVE = _endings(('ейш ейше', False))
+DERIVATIONAL = _endings(('ост ость', False))
+
+
+def _remove(word, endings):
+    '''Слово без самого длинного подходящего окончания или None'''
+    lengths, endings = endings
+    for length in lengths:
+        if length > len(word) or word[-length:] not in endings:
+            continue
+        stem = word[:-length]
+        if endings[word[-length:]] and not stem.endswith(('а', 'я')):
+            return None
+        return stem
+    return None
+
+
+def _region(word, start):
+    '''Начало области после первой пары «гласная, согласная» от start'''
+    for index in range(start + 1, len(word)):
+        if word[index - 1] in VOWELS and word[index] not in VOWELS:
+            return index + 1
+    return len(word)
+
+
+def _adjectival(word):
+    removed = _remove(word, ADJECTIVE)
+    if removed is None:
+        return None
+    participle = _remove(removed, PARTICIPLE)
+    return removed if participle is None else participle
+
+
+def _step_1(rv):
+    removed = _remove(rv, PERFECTIVE_GERUND)
+    if removed is not None:
+        return removed
+    removed = _remove(rv, REFLEXIVE)
+    if removed is not None:
+        rv = removed
+    for remove in (_adjectival, lambda word: _remove(word, VERB),
+                   lambda word: _remove(word, NOUN)):
+        removed = remove(rv)
+        if removed is not None:
+            return removed
+    return rv
+
+
+def _step_4(rv):
+    removed = _remove(rv, SUPERLATIVE)
+    if removed is not None:
+        rv = removed
+    if rv.endswith('нн'):
+        return rv[:-1]
+    if removed is None and rv.endswith('ь'):
+        return rv[:-1]
+    return rv
+
+
+@lru_cache(maxsize=100_000)
+def stem(word):
+    '''Основа слова; частые слова повторяются, поэтому основы кэшируются'''
+    word = word.lower().replace('ё', 'е')
+    match = re.search(f'[{VOWELS}]', word)
+    if match is None:
+        return word
+    prefix, rv = word[:match.end()], word[match.end():]
+    r2 = _region(word, _region(word, 0)) - len(prefix)
+    rv = _step_1(rv)
+    if rv.endswith('и'):
+        rv = rv[:-1]
+    removed = _remove(rv, DERIVATIONAL)
+    if removed is not None and len(removed) >= r2:
+        rv = removed
+    return prefix + _step_4(rv)
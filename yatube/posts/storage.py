@@ -0,0 +1,82 @@
+import hashlib
+import os
+import time
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+
+def content_hash(content):
+    '''SHA-256 содержимого файла, читаемого по частям'''
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    '''Хранилище, называющее файлы по хэшу содержимого.
+
+    Одинаковые загрузки получают одно имя вида posts/ab/abcd….gif и
+    хранятся одним файлом, поэтому и миниатюры у них общие. Удалять
+    файл можно только когда на него не ссылается ни один пост и его
+    не сохраняли заново, см. release(). Хэш, посчитанный при приёме загрузки
+    (uploads.ImageUploadHandler), повторно не считается.
+    '''
+
+    def hashed_name(self, name, content):
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        digest = getattr(content, 'sha256', None) or content_hash(content)
+        return os.path.join(directory, digest[:2], digest + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+        if self.claim(name):
+            return name
+        saved = super().save(name, content, max_length)
+        if saved != name:
+            # Тот же файл успел записать параллельный запрос.
+            self.delete(saved)
+        return name
+
+    def claim(self, name):
+        '''Отмечает имеющийся файл свежим временем изменения.
+
+        Пост с этим файлом ещё не записан, и release() по времени
+        изменения видит, что файл снова нужен. False, если файла нет.
+        '''
+        # Время берётся по тем же часам, что и момент удаления поста:
+        # ядро ставит время изменения по грубым часам
+        now = time.time()
+        try:
+            os.utime(self.path(name), (now, now))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def release(self, name, requested, in_use):
+        '''Удаляет файл, если после requested его не сохраняли заново
+        и in_use() ложно.
+
+        Сначала файл атомарно переименовывается. Загрузка тех же байт
+        после этого не найдёт его и запишет заново, а загрузка до этого
+        уже обновила время изменения, и файл возвращается на место.
+        '''
+        path = self.path(name)
+        released = f'{path}.released'
+        try:
+            os.rename(path, released)
+        except FileNotFoundError:
+            return False
+        if os.stat(released).st_mtime > requested or in_use():
+            # Новая копия на месте, если её успели записать, с тем же
+            # содержимым, поэтому замена ничего не портит
+            os.replace(released, path)
+            return False
+        os.remove(released)
+        return True
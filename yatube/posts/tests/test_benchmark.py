@@ -0,0 +1,51 @@
+import io
+import json
+import os
+import tempfile
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from posts import benchmark
+from posts.models import Comment, Follow, Post, User
+from posts.urls import urlpatterns
+
+
+class BenchmarkTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        call_command('seed_data', users=30, groups=3, posts=60,
+                     comments=40, follows=5, stdout=io.StringIO())
+
+    def test_seed_data(self):
+        """Генератор создаёт связанные данные и ведёт счётчики."""
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Post.objects.count(), 60)
+        self.assertEqual(Comment.objects.count(), 40)
+        self.assertTrue(Follow.objects.exists())
+        author = User.objects.filter(posts__isnull=False).first()
+        self.assertEqual(author.stats.posts_count, author.posts.count())
+
+    def test_benchmark_covers_every_url(self):
+        """Замер проходит по всем страницам posts.urls без ошибок."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'result.json')
+        call_command('benchmark', repeat=2, warmup=0, output=path)
+        with open(path, encoding='utf-8') as file:
+            report = json.load(file)
+        self.assertEqual(set(report['results']),
+                         {pattern.name for pattern in urlpatterns})
+        for name, result in report['results'].items():
+            with self.subTest(name=name):
+                self.assertLess(result['status'], 400)
+                self.assertGreaterEqual(result['p99_ms'], result['p50_ms'])
+        self.assertEqual(report['dataset']['posts'], 60)
+
+    def test_percentile(self):
+        """Перцентиль берётся по ближайшему рангу."""
+        values = list(range(1, 101))
+        self.assertEqual(benchmark.percentile(values, 50), 50)
+        self.assertEqual(benchmark.percentile(values, 99), 99)
+        self.assertEqual(benchmark.percentile([7], 99), 7)
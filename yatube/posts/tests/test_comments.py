@@ -0,0 +1,128 @@
+import io
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.db.models import QuerySet
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Comment, Post, User
+from yatube.settings import AMT_COMMENTS
+
+
+class CommentThreadTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.author)
+
+    def comment(self, text, parent=None):
+        return Comment.objects.create(post=self.post, author=self.author,
+                                      text=text, parent=parent)
+
+    def test_subtree_in_tree_order(self):
+        """Ветка читается одним диапазоном в порядке обхода дерева."""
+        root = self.comment('Корень')
+        first = self.comment('Первый', root)
+        second = self.comment('Второй', root)
+        nested = self.comment('Вложенный', first)
+        other = self.comment('Другой корень')
+        self.assertEqual(list(Comment.objects.subtree(root).order_by('path')),
+                         [first, nested, second])
+        self.assertEqual(nested.depth, 2)
+        self.assertEqual(nested.ancestor_ids, [root.pk, first.pk])
+        self.assertEqual(list(Comment.objects.subtree(other)), [])
+
+    def test_replies_count(self):
+        """Счётчик ответов есть у всех предков и пересчитывается."""
+        root = self.comment('Корень')
+        reply = self.comment('Ответ', root)
+        self.comment('Ответ на ответ', reply)
+        root.refresh_from_db()
+        self.assertEqual(root.replies_count, 2)
+        Comment.objects.get(pk=reply.pk).delete()
+        root.refresh_from_db()
+        self.assertEqual(root.replies_count, 0)
+        self.comment('Новый ответ', root)
+        Comment.objects.update(replies_count=0)
+        call_command('rebuild_counters', stdout=io.StringIO())
+        root.refresh_from_db()
+        self.assertEqual(root.replies_count, 1)
+
+    @override_settings(COMMENT_MAX_DEPTH=2)
+    def test_max_depth(self):
+        """Ответ глубже предела прикрепляется к предку."""
+        root = self.comment('Корень')
+        reply = self.comment('Ответ', root)
+        deep = self.comment('Глубже', reply)
+        self.assertEqual(deep.parent_id, root.pk)
+        self.assertEqual(deep.depth, 1)
+
+    def test_path_written_with_insert(self):
+        """Комментарий без пути не остаётся в базе."""
+        with mock.patch.object(QuerySet, 'update',
+                               side_effect=DatabaseError('сбой')):
+            with self.assertRaises(DatabaseError):
+                self.comment('Без пути')
+        self.assertFalse(Comment.objects.filter(text='Без пути').exists())
+
+    def test_reply_reads_parent_path(self):
+        """Путь родителя перечитывается из базы, пустой - ошибка."""
+        root = self.comment('Корень')
+        stale = Comment.objects.get(pk=root.pk)
+        stale.path = ''
+        reply = self.comment('Ответ', stale)
+        self.assertEqual(reply.ancestor_ids, [root.pk])
+        Comment.objects.filter(pk=root.pk).update(path='')
+        with self.assertRaises(ValueError):
+            self.comment('Ещё ответ', Comment.objects.get(pk=root.pk))
+
+    def test_add_reply(self):
+        """Форма комментария принимает родителя отдельным полем."""
+        root = self.comment('Корень')
+        self.client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            {'text': 'Ответ', 'parent': root.pk},
+        )
+        self.assertEqual(Comment.objects.get(text='Ответ').parent, root)
+
+    def test_roots_are_paged(self):
+        """Страница поста показывает последние корни, остальные - ?before=."""
+        roots = [self.comment(f'Комментарий {index}')
+                 for index in range(AMT_COMMENTS + 2)]
+        self.comment('Ответ', roots[-1])
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        )
+        page = list(response.context['comments'])
+        self.assertEqual(page, roots[::-1][:AMT_COMMENTS])
+        response = self.client.get(
+            response.context['next_url'] + '&format=json'
+        )
+        data = response.json()
+        self.assertEqual([item['id'] for item in data['comments']],
+                         [roots[1].pk, roots[0].pk])
+        self.assertIsNone(data['next'])
+
+    def test_thread_fragment(self):
+        """Фрагмент ?thread= отдаёт ответы на комментарий."""
+        root = self.comment('Корень')
+        self.comment('Ответ в ветке', root)
+        response = self.client.get(
+            reverse('posts:comments', kwargs={'post_id': self.post.pk}),
+            {'thread': root.pk},
+        )
+        self.assertContains(response, 'Ответ в ветке')
+        self.assertNotContains(response, 'Корень')
+        response = self.client.get(
+            reverse('posts:comments', kwargs={'post_id': self.post.pk}),
+            {'thread': 'x'},
+        )
+        self.assertEqual(response.status_code, 404)
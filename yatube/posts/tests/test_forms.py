@@ -1,18 +1,21 @@
+import hashlib
+import io
 import shutil
 import tempfile
 
 from http import HTTPStatus
+from unittest import mock
 
-from django.conf import settings
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
 from posts.forms import PostForm
 from posts.models import Comment, Group, Post, User
 
-TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
 
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
@@ -76,13 +79,81 @@ class CreateFormTests(TestCase):
             'posts:profile', kwargs={'username': self.author.username})
         )
         self.assertEqual(Post.objects.count(), posts_count + 1)
+        digest = hashlib.sha256(self.small_gif).hexdigest()
         self.assertTrue(Post.objects.filter(
             text='Тестовый текст поста',
             group=1,
-            image='posts/small.gif').exists()
+            image=f'posts/{digest[:2]}/{digest}.gif').exists()
         )
         self.assertEqual(response.status_code, HTTPStatus.OK)
 
+    @override_settings(IMAGE_MAX_SIDE=40)
+    def test_upload_is_normalized(self):
+        '''Тест. Картинка поворачивается по EXIF, уменьшается и без EXIF.'''
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        buffer = io.BytesIO()
+        Image.new('RGB', (100, 50)).save(buffer, 'JPEG', exif=exif)
+        form = PostForm(
+            data={'text': 'Пост с фотографией'},
+            files={'image': SimpleUploadedFile(
+                'photo.jpg', buffer.getvalue(), content_type='image/jpeg'
+            )},
+        )
+        self.assertTrue(form.is_valid())
+        image = Image.open(form.cleaned_data['image'])
+        self.assertEqual(image.size, (20, 40))
+        self.assertFalse(image.getexif())
+
+    @override_settings(IMAGE_MAX_PIXELS=1)
+    def test_huge_upload_is_rejected(self):
+        '''Тест. Картинка больше IMAGE_MAX_PIXELS не принимается.'''
+        form = PostForm(
+            data={'text': 'Пост с огромной картинкой'},
+            files={'image': SimpleUploadedFile(
+                'small.gif', self.small_gif, content_type='image/gif'
+            )},
+        )
+        self.assertFalse(form.is_valid())
+        self.assertIn('image', form.errors)
+
+    def test_upload_handler_rejects_non_image(self):
+        '''Тест. Файл без сигнатуры картинки отклоняется при приёме.'''
+        posts_count = Post.objects.count()
+        response = self.authorized_client_1.post(
+            reverse('posts:post_create'),
+            data={
+                'text': 'Пост с текстовым файлом',
+                'image': SimpleUploadedFile(
+                    'fake.gif', b'#!/bin/sh\necho hello\n',
+                    content_type='image/gif'
+                ),
+            },
+        )
+        self.assertEqual(Post.objects.count(), posts_count)
+        self.assertFormError(
+            response, 'form', 'image',
+            'Загрузите картинку в формате JPEG, PNG, GIF или WebP'
+        )
+
+    @override_settings(IMAGE_MAX_UPLOAD_SIZE=20)
+    def test_upload_handler_rejects_large_file(self):
+        '''Тест. Файл больше IMAGE_MAX_UPLOAD_SIZE обрывается при приёме.'''
+        posts_count = Post.objects.count()
+        response = self.authorized_client_1.post(
+            reverse('posts:post_create'),
+            data={
+                'text': 'Пост с большой картинкой',
+                'image': SimpleUploadedFile(
+                    'small.gif', self.small_gif, content_type='image/gif'
+                ),
+            },
+        )
+        self.assertEqual(Post.objects.count(), posts_count)
+        self.assertFormError(
+            response, 'form', 'image', 'Файл больше 20\xa0байт'
+        )
+
     def test_unauthorized_user_cant_create_post(self):
         '''Тест. Неавторизованный пользователь не может создать пост'''
         response = self.guest_client.post(
@@ -131,6 +202,26 @@ class CreateFormTests(TestCase):
             group=2).exists()
         )
 
+    def test_post_edit_keeps_concurrent_comment_count(self):
+        '''Тест. Правка поста не затирает счётчик комментария,
+        добавленного между загрузкой поста и сохранением формы.'''
+        is_valid = PostForm.is_valid
+
+        def comment_then_validate(form):
+            Comment.objects.create(
+                post=self.post, author=self.author, text='Пока правили'
+            )
+            return is_valid(form)
+
+        with mock.patch.object(PostForm, 'is_valid', comment_then_validate):
+            self.authorized_client_1.post(
+                reverse('posts:post_edit', kwargs={'post_id': self.post.id}),
+                data={'text': 'Правка', 'group': self.group.id},
+            )
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(post.text, 'Правка')
+        self.assertEqual(post.comments_count, 1)
+
     def test_forms_add_comment(self):
         '''Тест forms отправки комментария.'''
         comment_count = Comment.objects.count()
@@ -170,18 +261,7 @@ class CreateFormTests(TestCase):
         '''Тест. Кеширование на главной странице.'''
         response = self.authorized_client_1.get(reverse('posts:index'))
         first_object = response.content
-        form_data = {
-            'text': 'Тестовый текст поста',
-            'group': self.group.id,
-        }
-        post_create = self.authorized_client_1.post(
-            reverse('posts:post_create'),
-            data=form_data,
-            follow=True
-        )
-        self.assertRedirects(post_create, reverse(
-            'posts:profile', kwargs={'username': self.author.username})
-        )
+        Post.objects.filter(pk=self.post.pk).update(text='Изменено в базе')
         response_2 = self.authorized_client_1.get(reverse('posts:index'))
         second_object = response_2.content
         self.assertEqual(first_object, second_object)
@@ -189,7 +269,22 @@ class CreateFormTests(TestCase):
         response_after_cache_clear = self.authorized_client_1.get(
             reverse('posts:index')
         )
-        self.assertNotEqual(response_2, response_after_cache_clear)
+        self.assertNotEqual(second_object, response_after_cache_clear.content)
+
+    def test_new_post_invalidates_index_cache(self):
+        '''Тест. Новый пост сразу виден на закешированной главной.'''
+        self.authorized_client_1.get(reverse('posts:index'))
+        form_data = {
+            'text': 'Свежий пост после кеширования',
+            'group': self.group.id,
+        }
+        self.authorized_client_1.post(
+            reverse('posts:post_create'),
+            data=form_data,
+            follow=True
+        )
+        response = self.authorized_client_1.get(reverse('posts:index'))
+        self.assertContains(response, 'Свежий пост после кеширования')
 
     def test_label(self):
         '''Тест поля label.'''
@@ -0,0 +1,75 @@
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, User
+
+
+class IndexUsageTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовый заголовок',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        for i in range(15):
+            cls.post = Post.objects.create(
+                author=cls.author,
+                group=cls.group,
+                text=f'Тестовый текст поста {i}',
+            )
+        Comment.objects.create(
+            author=cls.reader, post=cls.post, text='Комментарий'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.reader)
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def list_queries(self, url):
+        '''SQL выборок страницы и следующей за ней по курсору'''
+        with CaptureQueriesContext(connection) as context:
+            response = self.authorized_client.get(url)
+            page_obj = response.context.get('page_obj')
+            if page_obj is not None and page_obj.next_cursor:
+                self.authorized_client.get(
+                    url, {'cursor': page_obj.next_cursor}
+                )
+        tables = ('"posts_post"', '"posts_feedentry"', '"posts_comment"')
+        return [
+            query['sql'] for query in context.captured_queries
+            if 'ORDER BY' in query['sql']
+            and query['sql'].split(' FROM ')[1].startswith(tables)
+        ]
+
+    def test_list_views_use_indexes(self):
+        """Списки постов читаются по индексу без сортировки в памяти."""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+            reverse('posts:follow_index'),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+        ]
+        for url in urls:
+            queries = self.list_queries(url)
+            for sql in queries:
+                with self.subTest(url=url, sql=sql):
+                    plan = self.explain(sql)
+                    self.assertFalse(
+                        any('TEMP B-TREE' in step for step in plan), plan
+                    )
+                    self.assertTrue(
+                        all('USING' in step for step in plan), plan
+                    )
+            if url != urls[-1]:
+                self.assertTrue(queries, url)
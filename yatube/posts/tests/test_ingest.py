@@ -0,0 +1,199 @@
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from django.core.management import call_command
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from posts import search
+from posts.ingest import Ingest
+from posts.models import Comment, Follow, Group, Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+def ndjson(*rows):
+    return [json.dumps(row, ensure_ascii=False) for row in rows]
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class IngestTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_rows_are_loaded_with_side_effects(self):
+        """Загруженные посты видны в счётчиках и поиске."""
+        result = Ingest(chunk_size=2).run(ndjson(
+            {'type': 'post', 'key': 'a', 'author': 'author',
+             'group': 'group', 'text': 'Старый пароход',
+             'pub_date': '2015-06-01T10:00:00'},
+            {'type': 'post', 'author': 'author', 'text': 'Второй'},
+            {'type': 'comment', 'post': 'a', 'author': 'reader',
+             'text': 'Ответ'},
+        ))
+        self.assertEqual((result.posts, result.comments, result.errors),
+                         (2, 1, []))
+        post = Post.objects.get(text='Старый пароход')
+        self.assertEqual(post.pub_date.year, 2015)
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(Comment.objects.get().post, post)
+        self.assertEqual(Group.objects.get().posts_count, 1)
+        self.assertEqual(User.objects.get(username='author')
+                         .stats.posts_count, 2)
+        self.assertEqual(search.search('пароходы', 10)[0][0], post.pk)
+
+    def test_bad_rows_are_reported(self):
+        """Ошибочные строки пропускаются с номером строки."""
+        result = Ingest().run(ndjson(
+            {'type': 'post', 'author': 'nobody', 'text': 'Пост'},
+            {'type': 'post', 'author': 'author', 'text': ''},
+            {'type': 'post', 'author': 'author', 'text': 'Пост',
+             'group': 'missing'},
+            {'type': 'comment', 'post': 0, 'author': 'author',
+             'text': 'Ответ'},
+            {'type': 'post', 'author': 'author', 'text': 'Пост',
+             'image': '../secret.gif'},
+            {'type': 'post', 'author': 'author', 'text': 'Годный'},
+        ) + ['{', '[]'])
+        self.assertEqual([number for number, _ in result.errors],
+                         [1, 2, 3, 4, 5, 7, 8])
+        self.assertEqual(result.posts, 1)
+
+    def test_only_own_rows_for_author(self):
+        """С заданным автором чужие записи не загружаются."""
+        result = Ingest(author=self.reader).run(ndjson(
+            {'type': 'post', 'text': 'Свой'},
+            {'type': 'post', 'author': 'author', 'text': 'Чужой'},
+        ))
+        self.assertEqual(result.posts, 1)
+        self.assertEqual(Post.objects.get().author, self.reader)
+
+    def test_dates(self):
+        """Дату задаёт только загрузка без автора и не из будущего."""
+        result = Ingest(author=self.reader).run(ndjson(
+            {'type': 'post', 'text': 'Закреплённый',
+             'pub_date': '2999-01-01T00:00:00'},
+        ))
+        self.assertEqual(result.errors,
+                         [(1, 'pub_date может задавать только сотрудник')])
+        before = timezone.now()
+        result = Ingest().run(ndjson(
+            {'type': 'post', 'key': 'a', 'author': 'author',
+             'text': 'Из будущего', 'pub_date': '2999-01-01T00:00:00'},
+            {'type': 'comment', 'post': 'a', 'author': 'reader',
+             'text': 'Ответ', 'created': '2999-01-01T00:00:00'},
+        ))
+        self.assertEqual((result.posts, result.comments), (1, 1))
+        self.assertLessEqual(Post.objects.get().pub_date, timezone.now())
+        self.assertGreaterEqual(Post.objects.get().pub_date, before)
+        self.assertLessEqual(Comment.objects.get().created, timezone.now())
+
+    def test_command_stores_images(self):
+        """Команда загружает файл и кладёт картинку в хранилище."""
+        source = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, source, ignore_errors=True)
+        with open(os.path.join(source, 'small.gif'), 'wb') as file:
+            file.write(SMALL_GIF)
+        path = os.path.join(source, 'posts.ndjson')
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write('\n'.join(ndjson(
+                {'type': 'post', 'author': 'author', 'text': 'С картинкой',
+                 'image': 'small.gif'},
+            )))
+        stdout = io.StringIO()
+        call_command('ingest_posts', path, images=source, stdout=stdout)
+        self.assertIn('Загружено постов: 1', stdout.getvalue())
+        post = Post.objects.get()
+        self.assertTrue(post.image.storage.exists(post.image.name))
+
+
+# Загрузка в отдельном процессе: тестовая база в памяти не выдерживает
+# записи из пула потоков, а ошибка видна только на файле в режиме WAL
+THREADED_SETTINGS = """
+from yatube.settings import *
+
+DATABASES['default']['NAME'] = {database!r}
+MEDIA_ROOT = {media!r}
+BACKGROUND_WORKERS = 2
+BACKGROUND_JOBS = False
+"""
+THREADED_INGEST = """
+import json
+
+import django
+
+django.setup()
+
+from core import background
+from posts.ingest import Ingest
+from posts.models import FeedEntry, Follow, User
+
+author = User.objects.create_user(username='author')
+Follow.objects.bulk_create([
+    Follow(user=User.objects.create_user(username=f'reader{n}'),
+           author=author)
+    for n in range(50)
+])
+result = Ingest(chunk_size=100).run([
+    json.dumps({'type': 'post', 'author': 'author', 'text': f'Пост {n}'})
+    for n in range(1000)
+])
+background.get_executor().shutdown(wait=True)
+print(json.dumps([result.posts, result.errors, FeedEntry.objects.count()]))
+"""
+
+
+class ThreadedIngestTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        with open(os.path.join(self.directory, 'threaded_settings.py'),
+                  'w') as file:
+            file.write(THREADED_SETTINGS.format(
+                database=os.path.join(self.directory, 'db.sqlite3'),
+                media=os.path.join(self.directory, 'media'),
+            ))
+
+    def run_python(self, *args):
+        env = dict(
+            os.environ, DJANGO_SETTINGS_MODULE='threaded_settings',
+            PYTHONPATH=os.pathsep.join([self.directory, settings.BASE_DIR]),
+        )
+        process = subprocess.run([sys.executable, *args], env=env,
+                                 capture_output=True, text=True)
+        self.assertEqual(process.returncode, 0, process.stderr)
+        return process.stdout
+
+    def test_chunks_commit_while_background_work_runs(self):
+        """Пачки загружаются, пока пул потоков раскладывает прошлые."""
+        self.run_python(os.path.join(settings.BASE_DIR, 'manage.py'),
+                        'migrate', '-v0')
+        output = self.run_python('-c', THREADED_INGEST)
+        self.assertEqual(json.loads(output.splitlines()[-1]),
+                         [1000, [], 1000 * 50])
@@ -1,6 +1,10 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
 from django.test import TestCase
 
-from ..models import Group, Post, User
+from ..models import AuthorStats, Comment, Follow, Group, Post, User
 
 
 class PostModelTest(TestCase):
@@ -30,3 +34,84 @@ class PostModelTest(TestCase):
             with self.subTest():
                 self.assertEqual(
                     expected_object_name, str(expected_object_name))
+
+    def test_follow_is_unique(self):
+        """Повторная подписка на того же автора запрещена базой."""
+        reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=reader, author=self.user)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Follow.objects.create(user=reader, author=self.user)
+
+
+class PostCountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.group_2 = Group.objects.create(
+            title='Тестовая группа 2',
+            slug='test-slug-2',
+            description='Тестовое описание 2',
+        )
+
+    def counts(self):
+        self.group.refresh_from_db()
+        self.group_2.refresh_from_db()
+        return (
+            AuthorStats.objects.get(author=self.user).posts_count,
+            self.group.posts_count,
+            self.group_2.posts_count,
+        )
+
+    def test_counters_follow_post_changes(self):
+        """Счётчики постов обновляются при создании, правке и удалении."""
+        post = Post.objects.create(
+            author=self.user, group=self.group, text='Тестовый пост'
+        )
+        Post.objects.create(author=self.user, text='Пост без группы')
+        self.assertEqual(self.counts(), (2, 1, 0))
+        post.group = self.group_2
+        post.save()
+        self.assertEqual(self.counts(), (2, 0, 1))
+        post.delete()
+        self.assertEqual(self.counts(), (1, 0, 0))
+
+    def test_counters_follow_comments_and_follows(self):
+        """Счётчики комментариев и подписчиков обновляются сигналами."""
+        reader = User.objects.create_user(username='reader')
+        post = Post.objects.create(author=self.user, text='Тестовый пост')
+        comment = Comment.objects.create(
+            author=reader, post=post, text='Комментарий'
+        )
+        Follow.objects.create(user=reader, author=self.user)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.user.stats.followers_count, 1)
+        self.assertEqual(
+            AuthorStats.objects.get(author=reader).following_count, 1
+        )
+        comment.delete()
+        Follow.objects.filter(user=reader, author=self.user).delete()
+        post.refresh_from_db()
+        self.user.stats.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        self.assertEqual(self.user.stats.followers_count, 0)
+
+    def test_rebuild_counters_repairs_drift(self):
+        """Команда rebuild_counters пересчитывает счётчики с нуля."""
+        post = Post.objects.create(
+            author=self.user, group=self.group, text='Тестовый пост'
+        )
+        Comment.objects.create(author=self.user, post=post, text='Текст')
+        AuthorStats.objects.update(posts_count=42)
+        Post.objects.update(comments_count=0)
+        Group.objects.update(posts_count=7)
+        call_command('rebuild_counters', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(self.counts(), (1, 1, 0))
+        self.assertEqual(post.comments_count, 1)
@@ -0,0 +1,105 @@
+import io
+
+from django.apps import apps
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.loader import MigrationLoader
+from django.db.models.signals import post_migrate
+from django.test import TestCase
+from django.urls import reverse
+
+from posts import search
+from posts.models import Post, User
+from posts.signals import SEARCH_MIGRATION
+from posts.stemmer import stem
+
+
+class StemmerTests(TestCase):
+    def test_word_forms_share_stem(self):
+        """Формы одного слова сводятся к одной основе."""
+        words = {
+            'пароходы': 'пароход',
+            'красивые': 'красив',
+            'ожесточенности': 'ожесточен',
+            'играющими': 'игра',
+            'ёлки': 'елк',
+        }
+        for word, expected in words.items():
+            with self.subTest(word=word):
+                self.assertEqual(stem(word), expected)
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.rare = Post.objects.create(
+            author=cls.author, text='Кошки спят на подоконнике'
+        )
+        cls.often = Post.objects.create(
+            author=cls.author, text='Кошка и ещё кошка, и кошке тепло'
+        )
+        Post.objects.create(author=cls.author, text='Собака лает')
+        cls.url = reverse('posts:search')
+
+    def test_search_finds_word_forms_by_rank(self):
+        """Поиск находит другие формы слова, частые вхождения выше."""
+        response = self.client.get(self.url, {'q': 'кошкой'})
+        self.assertEqual(list(response.context['page_obj']),
+                         [self.often, self.rare])
+
+    def test_index_follows_edits_and_deletes(self):
+        """Правка и удаление поста сразу видны в поиске."""
+        rare = Post.objects.get(pk=self.rare.pk)
+        rare.text = 'Попугаи не спят'
+        rare.save()
+        self.assertEqual(
+            [pk for pk, _ in search.search('попугай', 10)], [self.rare.pk]
+        )
+        self.assertEqual(
+            [pk for pk, _ in search.search('кошки', 10)], [self.often.pk]
+        )
+        Post.objects.get(pk=self.often.pk).delete()
+        self.assertEqual(search.search('кошки', 10), [])
+
+    def test_cursor_paging(self):
+        """Выдача листается курсором без повторов и пропусков."""
+        posts = [
+            Post.objects.create(author=self.author, text=f'Дождь {number}')
+            for number in range(13)
+        ]
+        response = self.client.get(self.url, {'q': 'дожди'})
+        first = list(response.context['page_obj'])
+        next_cursor = response.context['page_obj'].next_cursor
+        response = self.client.get(
+            self.url, {'q': 'дожди', 'cursor': next_cursor}
+        )
+        second = list(response.context['page_obj'])
+        self.assertEqual((len(first), len(second)), (10, 3))
+        self.assertCountEqual(first + second, posts)
+
+    def test_rebuild_command(self):
+        """Команда заново строит индекс по всем постам."""
+        call_command('rebuild_search_index', stdout=io.StringIO())
+        self.assertEqual(
+            [pk for pk, _ in search.search('собаки', 10)],
+            list(Post.objects.filter(text='Собака лает').values_list(
+                'pk', flat=True
+            )),
+        )
+
+    def test_index_built_after_migrate(self):
+        """Индекс заполняется после миграции, создавшей его таблицу."""
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {search.TABLE}')
+        self.assertEqual(search.search('собаки', 10), [])
+        migration = MigrationLoader(connection).graph.nodes[
+            ('posts', SEARCH_MIGRATION)
+        ]
+        post_migrate.send(
+            sender=apps.get_app_config('posts'),
+            app_config=apps.get_app_config('posts'),
+            plan=[(migration, False)], using=connection.alias,
+        )
+        self.assertEqual(len(search.search('собаки', 10)), 1)
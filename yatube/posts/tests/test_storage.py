@@ -0,0 +1,105 @@
+import io
+import shutil
+import tempfile
+import time
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from posts import images
+from posts.models import Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ContentAddressedStorageTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.storage = Post._meta.get_field('image').storage
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self, name='small.gif'):
+        return Post.objects.create(
+            author=self.author,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile(name, SMALL_GIF, 'image/gif'),
+        )
+
+    def test_same_upload_shares_one_file(self):
+        """Одинаковые загрузки хранятся одним файлом."""
+        first = self.create_post('first.gif')
+        second = self.create_post('second.gif')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(
+            self.storage.listdir(first.image.name.rsplit('/', 1)[0])[1],
+            [first.image.name.rsplit('/', 1)[1]],
+        )
+
+    @override_settings(IMAGE_RELEASE_GRACE=0)
+    def test_file_removed_with_last_reference(self):
+        """Файл удаляется, только когда его не использует ни один пост."""
+        first = self.create_post()
+        second = self.create_post()
+        name = first.image.name
+        first.delete()
+        images.release(name)
+        self.assertTrue(self.storage.exists(name))
+        second.delete()
+        images.release(name)
+        self.assertFalse(self.storage.exists(name))
+
+    @override_settings(IMAGE_RELEASE_GRACE=0)
+    def test_upload_during_release_keeps_file(self):
+        """Загрузка тех же байт после удаления поста, но до записи
+        нового поста, не теряет файл."""
+        post = self.create_post()
+        name = post.image.name
+        post.delete()
+        requested = time.time()
+        # Параллельный запрос сохранил тот же файл, пост ещё не записан
+        self.assertEqual(
+            self.storage.save('posts/again.gif', ContentFile(SMALL_GIF)), name
+        )
+        images.release(name, requested=requested)
+        self.assertTrue(self.storage.exists(name))
+
+    def test_recent_file_survives_release(self):
+        """Файл, сохранённый в пределах IMAGE_RELEASE_GRACE, не удаляется."""
+        post = self.create_post()
+        name = post.image.name
+        post.delete()
+        images.release(name)
+        self.assertTrue(self.storage.exists(name))
+
+    def test_dedupe_media_merges_copies(self):
+        """Команда переносит старые копии картинки в один файл по хэшу."""
+        plain = FileSystemStorage()
+        for number in range(2):
+            name = plain.save(f'posts/copy_{number}.gif',
+                              ContentFile(SMALL_GIF))
+            Post.objects.create(author=self.author, text='Пост', image=name)
+        call_command('dedupe_media', stdout=io.StringIO())
+        names = set(Post.objects.values_list('image', flat=True))
+        self.assertEqual(len(names), 1)
+        self.assertTrue(self.storage.exists(names.pop()))
+        self.assertFalse(plain.exists('posts/copy_0.gif'))
+        self.assertFalse(plain.exists('posts/copy_1.gif'))
@@ -1,3 +1,4 @@
+from django.core.cache import cache
 from django.test import TestCase
 from django.urls import reverse
 
@@ -27,6 +28,9 @@ class PaginatorViewsTests(TestCase):
             reverse('posts:group_list', kwargs={'slug': 'test-slug'}),
         ]
 
+    def setUp(self):
+        cache.clear()
+
     def test_first_page_contains_ten_records(self):
         """Тест. Количество постов на первой странице равно 10."""
         for reverse_name in self.reverse_names:
@@ -38,5 +42,30 @@ class PaginatorViewsTests(TestCase):
         """Тест. На второй странице должно быть три поста."""
         for reverse_name in self.reverse_names:
             with self.subTest(reverse_name=reverse_name):
-                response = self.client.get(reverse_name + '?page=2')
-                self.assertEqual(len(response.context['page_obj']), 3)
+                response = self.client.get(reverse_name)
+                cursor = response.context['page_obj'].next_cursor
+                response = self.client.get(reverse_name, {'cursor': cursor})
+                page_obj = response.context['page_obj']
+                self.assertEqual(len(page_obj), 3)
+                self.assertFalse(page_obj.has_next())
+                self.assertEqual(page_obj[2], self.posts[0])
+
+    def test_previous_cursor_returns_first_page(self):
+        """Тест. Курсор назад со второй страницы ведёт на первую."""
+        for reverse_name in self.reverse_names:
+            with self.subTest(reverse_name=reverse_name):
+                response = self.client.get(reverse_name)
+                first_page = list(response.context['page_obj'])
+                cursor = response.context['page_obj'].next_cursor
+                response = self.client.get(reverse_name, {'cursor': cursor})
+                cursor = response.context['page_obj'].previous_cursor
+                response = self.client.get(reverse_name, {'cursor': cursor})
+                self.assertEqual(
+                    list(response.context['page_obj']), first_page
+                )
+                self.assertFalse(response.context['page_obj'].has_previous())
+
+    def test_broken_cursor_returns_first_page(self):
+        """Тест. Битый курсор не ломает страницу."""
+        response = self.client.get(self.reverse_names[0], {'cursor': '!!'})
+        self.assertEqual(len(response.context['page_obj']), 10)
@@ -1,15 +1,25 @@
+import io
 import shutil
 import tempfile
+import time
 
-from django.conf import settings
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
 from django import forms
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from django.utils.http import http_date
 
-from posts.models import Group, Post, Follow, User
+from posts import thumbnails
+from posts.feed import fan_out
+from posts.models import (
+    Comment, FeedEntry, Group, Post, Follow, Thumbnail, User
+)
 
-TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+from .utils import QueryBudgetMixin
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
 
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
@@ -154,3 +164,270 @@ class ViewsTests(TestCase):
         follow.delete()
         response = Follow.objects.count()
         self.assertEqual(response, follow_count)
+
+
+class FeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.client_reader = Client()
+        cls.client_reader.force_login(cls.reader)
+
+    def feed(self):
+        response = self.client_reader.get(reverse('posts:follow_index'))
+        return list(response.context['page_obj'])
+
+    def test_follow_backfills_and_unfollow_prunes_feed(self):
+        """Подписка заполняет ленту, отписка её очищает."""
+        post = Post.objects.create(author=self.author, text='Тестовый пост')
+        self.client_reader.get(
+            reverse('posts:profile_follow', kwargs={'username': 'author'})
+        )
+        self.assertTrue(
+            FeedEntry.objects.filter(user=self.reader, post=post).exists()
+        )
+        self.assertEqual(self.feed(), [post])
+        self.client_reader.get(
+            reverse('posts:profile_unfollow', kwargs={'username': 'author'})
+        )
+        self.assertFalse(FeedEntry.objects.filter(user=self.reader).exists())
+        self.assertEqual(self.feed(), [])
+
+    def test_fan_out_delivers_new_post(self):
+        """Новый пост раскладывается по лентам подписчиков."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='Тестовый пост')
+        fan_out(post.pk)
+        self.assertEqual(self.feed(), [post])
+
+    @override_settings(FEED_PULL_THRESHOLD=1)
+    def test_popular_author_posts_are_pulled(self):
+        """Посты популярного автора читаются без раскладки по лентам."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='Тестовый пост')
+        fan_out(post.pk)
+        self.assertFalse(FeedEntry.objects.exists())
+        self.assertEqual(self.feed(), [post])
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовый заголовок',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        for i in range(12):
+            author = User.objects.create_user(username=f'author{i}')
+            cls.post = Post.objects.create(
+                author=author,
+                group=cls.group,
+                text=f'Тестовый текст поста {i}',
+            )
+            Comment.objects.create(
+                author=author, post=cls.post, text='Комментарий'
+            )
+            Follow.objects.create(user=cls.reader, author=author)
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.reader)
+
+    def test_views_stay_within_query_budget(self):
+        """Число запросов страницы не зависит от числа постов на ней."""
+        budgets = {
+            reverse('posts:index'): 3,
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'}): 4,
+            reverse('posts:profile', kwargs={'username': 'author0'}): 5,
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}): 4,
+            reverse('posts:follow_index'): 5,
+        }
+        for url, budget in budgets.items():
+            with self.subTest(url=url):
+                cache.clear()
+                with self.assertMaxQueries(budget):
+                    self.authorized_client.get(url)
+
+
+class AnonymousPageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(
+            author=cls.author, text='Тестовый текст поста'
+        )
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.author)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_conditional_get_returns_not_modified(self):
+        """Совпавший ETag получает 304 без рендера страницы."""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertNotIn('Last-Modified', response)
+                response = self.client.get(
+                    url, HTTP_IF_NONE_MATCH=response['ETag']
+                )
+                self.assertEqual(response.status_code, 304)
+
+    def test_if_modified_since_alone_is_not_trusted(self):
+        """Правка поста видна клиенту, который шлёт только дату."""
+        url = reverse('posts:index')
+        self.client.get(url)
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Исправленный текст'
+        post.save()
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 3600)
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Исправленный текст')
+
+    def test_anonymous_page_is_served_from_cache(self):
+        """Аноним получает сохранённую страницу до изменения данных."""
+        url = reverse('posts:index')
+        self.client.get(url)
+        response = self.client.get(url)
+        self.assertIsNone(response.context)
+        etag = response['ETag']
+        Comment.objects.create(
+            author=self.author, post=self.post, text='Комментарий'
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNotNone(response.context)
+
+    def test_author_and_group_edits_expire_pages(self):
+        """Смена имени автора или названия группы сбрасывает страницы."""
+        group = Group.objects.create(title='Группа', slug='group',
+                                     description='Описание')
+        Post.objects.create(author=self.author, group=group, text='В группе')
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'group'}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+        ]
+        for change, text in (
+            (lambda: User.objects.get(pk=self.author.pk).save(), None),
+            (self.rename_author, 'Лев Толстой'),
+            (self.rename_group, 'Новое название'),
+        ):
+            for url in urls:
+                self.client.get(url)
+            change()
+            for url in urls:
+                with self.subTest(url=url, text=text):
+                    response = self.client.get(url)
+                    self.assertEqual(response.context is not None,
+                                     text is not None)
+                    if text is not None and 'group' in url:
+                        self.assertContains(response, text)
+
+    def rename_author(self):
+        author = User.objects.get(pk=self.author.pk)
+        author.first_name, author.last_name = 'Лев', 'Толстой'
+        author.save()
+
+    def rename_group(self):
+        group = Group.objects.get(slug='group')
+        group.title = 'Новое название'
+        group.save()
+
+    def test_authorized_user_bypasses_page_cache(self):
+        """Авторизованный пользователь всегда получает свежий рендер."""
+        url = reverse('posts:index')
+        self.authorized_client.get(url)
+        response = self.authorized_client.get(url)
+        self.assertIsNotNone(response.context)
+        self.assertNotIn('ETag', response)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(
+            author=cls.author,
+            text='Тестовый текст поста',
+            image=SimpleUploadedFile(
+                name='small.gif',
+                content=(
+                    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+                    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+                    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+                    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+                    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+                    b'\x0A\x00\x3B'
+                ),
+                content_type='image/gif',
+            ),
+        )
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.author)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_page_shows_original_until_thumbnail_ready(self):
+        """Без готовой миниатюры страница ссылается на оригинал."""
+        url = reverse('posts:index')
+        response = self.authorized_client.get(url)
+        self.assertContains(response, self.post.image.url)
+        self.assertIsNone(thumbnails.ready_url(self.post.image, 'card'))
+        thumbnails.generate(self.post.image.name)
+        thumbnail_url = thumbnails.ready_url(self.post.image, 'card')
+        self.assertIsNotNone(thumbnail_url)
+        response = self.authorized_client.get(url)
+        self.assertContains(response, thumbnail_url)
+        self.assertNotContains(response, self.post.image.url)
+
+    def test_page_thumbnails_resolved_in_one_query(self):
+        """Миниатюры всех постов страницы ищутся одним запросом."""
+        thumbnails.generate(self.post.image.name)
+        posts = [self.post] + [
+            Post.objects.create(
+                author=self.author, text='Пост', image=f'posts/{number}.gif'
+            )
+            for number in range(3)
+        ]
+        thumbnails.attach(posts, 'card')
+        with self.assertNumQueries(1):
+            urls = [thumbnails.ready_url(post.image, 'card')
+                    for post in posts]
+        self.assertIsNotNone(urls[0])
+        self.assertEqual(urls[1:], [None] * 3)
+
+    def test_warm_thumbnails_command(self):
+        """Команда заполняет индекс миниатюр для существующих картинок."""
+        call_command('warm_thumbnails', stdout=io.StringIO())
+        self.assertTrue(Thumbnail.objects.filter(
+            source=self.post.image.name
+        ).exists())
+
+    def test_generate_fills_srcset(self):
+        """Фоновая задача записывает копии картинки для srcset."""
+        thumbnails.generate(self.post.image.name)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.image_srcset, f'{self.post.image.name} 2')
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        response = self.authorized_client.get(url)
+        self.assertContains(response, f'{self.post.image.url} 2w')
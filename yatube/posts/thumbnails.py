@@ -0,0 +1,95 @@
+import json
+import logging
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.utils.functional import cached_property
+from sorl.thumbnail import get_thumbnail
+
+from . import generations, images
+from .models import Post, Thumbnail
+
+logger = logging.getLogger(__name__)
+
+
+def rendition_key(rendition):
+    '''Геометрия и опции rendition в том виде, в котором они в индексе'''
+    geometry, options = settings.THUMBNAIL_RENDITIONS[rendition]
+    return geometry, json.dumps(options, sort_keys=True)
+
+
+class RenditionBatch:
+    '''Адреса готовых миниатюр для набора картинок одним запросом.
+
+    Запрос выполняется при первом обращении, поэтому страница,
+    отданная из кэша фрагментов, в базу не ходит.
+    '''
+
+    def __init__(self, names, rendition):
+        self.names = {name for name in names if name}
+        self.rendition = rendition
+
+    @cached_property
+    def urls(self):
+        if not self.names:
+            return {}
+        geometry, options = rendition_key(self.rendition)
+        return {
+            source: default_storage.url(name)
+            for source, name in Thumbnail.objects.filter(
+                source__in=self.names, geometry=geometry, options=options
+            ).values_list('source', 'name')
+        }
+
+
+def attach(posts, rendition):
+    '''Готовит для постов страницы общий поиск миниатюр rendition'''
+    batch = RenditionBatch([post.image.name for post in posts], rendition)
+    for post in posts:
+        post.renditions = {**getattr(post, 'renditions', {}),
+                           rendition: batch}
+
+
+def ready_url(image, rendition):
+    '''Адрес готовой миниатюры rendition для картинки или None'''
+    batch = getattr(image.instance, 'renditions', {}).get(rendition)
+    if batch is None:
+        batch = RenditionBatch([image.name], rendition)
+    return batch.urls.get(image.name)
+
+
+def index(name):
+    '''Создаёт миниатюры из THUMBNAIL_RENDITIONS и записывает их в индекс'''
+    for rendition, (geometry, options) in (
+            settings.THUMBNAIL_RENDITIONS.items()):
+        logger.debug('Миниатюра %s для %s', rendition, name)
+        thumbnail = get_thumbnail(name, geometry, **options)
+        Thumbnail.objects.update_or_create(
+            source=name,
+            geometry=geometry,
+            options=json.dumps(options, sort_keys=True),
+            defaults={'name': thumbnail.name, 'width': thumbnail.width,
+                      'height': thumbnail.height},
+        )
+
+
+def generate(name):
+    '''Создаёт миниатюры и копии для srcset для файла name.
+
+    Миниатюры попадают в индекс Thumbnail, копии записываются
+    в Post.image_srcset. После этого страницы с постами сбрасываются,
+    чтобы в них попали готовые адреса.
+    '''
+    try:
+        variants = images.write_variants(name)
+    except (OSError, SuspiciousFileOperation):
+        logger.warning('Не удалось прочитать картинку %s', name)
+        return
+    index(name)
+    posts = Post.objects.filter(image=name)
+    posts.update(image_srcset=variants)
+    scopes = set()
+    for author_id, group_id in posts.values_list('author_id', 'group_id'):
+        scopes.update(generations.post_scopes(author_id, group_id))
+    generations.bump(*scopes)
@@ -0,0 +1,117 @@
+import functools
+import hashlib
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import (
+    FileUploadHandler, SkipFile, StopUpload
+)
+from django.template.defaultfilters import filesizeformat
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+
+# Начала файлов картинок, которые принимает сайт
+IMAGE_SIGNATURES = (
+    b'\xff\xd8\xff',
+    b'\x89PNG\r\n\x1a\n',
+    b'GIF87a',
+    b'GIF89a',
+)
+HEADER_SIZE = 12
+NOT_AN_IMAGE = 'Загрузите картинку в формате JPEG, PNG, GIF или WebP'
+
+
+def is_image_header(header):
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return True
+    return header.startswith(IMAGE_SIGNATURES)
+
+
+class ImageUploadHandler(FileUploadHandler):
+    '''Пишет загрузку на диск по частям и проверяет её на лету.
+
+    Запрос длиннее IMAGE_MAX_UPLOAD_SIZE отклоняется до чтения тела,
+    файл без сигнатуры картинки пропускается по первым байтам, а файл,
+    переросший лимит, обрывается на том куске, где это выяснилось.
+    Пока файл пишется, считается его SHA-256; он остаётся в атрибуте
+    sha256 и используется хранилищем вместо повторного чтения.
+    Причины отказа складываются в request.upload_errors.
+    '''
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.max_size = settings.IMAGE_MAX_UPLOAD_SIZE
+        self.too_large = False
+        request.upload_errors = {}
+
+    def reject(self, message):
+        self.request.upload_errors[self.field_name] = message
+
+    def handle_raw_input(self, input_data, META, content_length, boundary,
+                         encoding=None):
+        limit = self.max_size + settings.DATA_UPLOAD_MAX_MEMORY_SIZE
+        self.too_large = content_length > limit
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        if self.too_large or (self.content_length or 0) > self.max_size:
+            self.reject_size()
+        self.file = TemporaryUploadedFile(
+            self.file_name, self.content_type, 0, self.charset,
+            self.content_type_extra,
+        )
+        self.digest = hashlib.sha256()
+        self.header = b''
+
+    def reject_size(self):
+        self.reject(f'Файл больше {filesizeformat(self.max_size)}')
+        raise StopUpload(connection_reset=True)
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > self.max_size:
+            self.reject_size()
+        if len(self.header) < HEADER_SIZE:
+            self.header += raw_data[:HEADER_SIZE - len(self.header)]
+            if len(self.header) == HEADER_SIZE:
+                self.check_header()
+        self.digest.update(raw_data)
+        self.file.write(raw_data)
+
+    def check_header(self):
+        if not is_image_header(self.header):
+            self.reject(NOT_AN_IMAGE)
+            raise SkipFile
+
+    def file_complete(self, file_size):
+        if len(self.header) < HEADER_SIZE:
+            self.reject(NOT_AN_IMAGE)
+            self.file.close()
+            return None
+        self.file.seek(0)
+        self.file.size = file_size
+        self.file.sha256 = self.digest.hexdigest()
+        return self.file
+
+
+def image_uploads(view):
+    '''Принимает файлы запроса через ImageUploadHandler.
+
+    Обработчики загрузки можно сменить только до чтения request.POST,
+    а CsrfViewMiddleware читает его раньше представления, поэтому
+    проверка CSRF переносится внутрь декоратора.
+    '''
+    protected = csrf_protect(view)
+
+    @csrf_exempt
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.upload_handlers = [ImageUploadHandler(request)]
+        return protected(request, *args, **kwargs)
+    return wrapper
+
+
+def add_upload_errors(form, request):
+    '''Переносит отказы ImageUploadHandler в ошибки формы'''
+    if not form.is_bound:
+        return
+    for field, message in getattr(request, 'upload_errors', {}).items():
+        form.add_error(field, message)
@@ -1,10 +1,187 @@
-from django.core.paginator import Paginator
+import base64
+import binascii
+import json
+
+from django.core.paginator import Page, Paginator
+from django.db import connections
+from django.db.models import Max
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
 
 from yatube.settings import AMT_POSTS
 
+from .models import AuthorStats
+
+FORWARD = 'n'
+BACKWARD = 'p'
+
+
+def encode_cursor(direction, value, pk):
+    '''Упаковывает позицию (значение ключа, id) в токен для ?cursor='''
+    if hasattr(value, 'isoformat'):
+        value = value.isoformat()
+    raw = f'{direction}|{value}|{pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, parse_value=parse_datetime):
+    '''Распаковывает токен курсора, для битого токена возвращает None.
+
+    parse_value превращает строку ключа обратно в значение и возвращает
+    None или поднимает ValueError, если строка не подходит.
+    '''
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        direction, value, pk = raw.decode().split('|')
+        value = parse_value(value)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if direction not in (FORWARD, BACKWARD) or value is None:
+        return None
+    return direction, value, pk
+
+
+def estimate_count(queryset):
+    '''Оценка количества строк выборки без сканирования таблицы.
+
+    PostgreSQL отдаёт оценку планировщика из EXPLAIN. Для остальных баз
+    выборка без фильтров оценивается по максимальному id, а с фильтрами
+    считается честно.
+    '''
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+    if not queryset.query.where:
+        return queryset.aggregate(last=Max('pk'))['last'] or 0
+    return queryset.count()
+
+
+def author_stats(author):
+    '''Счётчики автора; для автора без записи счётчиков все они нулевые'''
+    try:
+        return author.stats
+    except AuthorStats.DoesNotExist:
+        return AuthorStats(author=author)
+
+
+def keyset(queryset, date_field, descending=True, position=None,
+           id_field='id'):
+    '''Выборка в порядке (date_field, id_field) строго после position.
+
+    Условие записано как диапазон по дате плюс исключение совпадающих
+    строк, чтобы база могла искать по индексу, а не сканировать
+    его с начала.
+    '''
+    prefix = '-' if descending else ''
+    queryset = queryset.order_by(
+        f'{prefix}{date_field}', f'{prefix}{id_field}'
+    )
+    if position is None:
+        return queryset
+    value, pk = position
+    bound = 'lte' if descending else 'gte'
+    tail = 'gte' if descending else 'lte'
+    return queryset.filter(**{f'{date_field}__{bound}': value}).exclude(
+        **{date_field: value, f'{id_field}__{tail}': pk}
+    )
+
+
+class CursorPaginator(Paginator):
+    '''Пагинация по ключу (дата, id) без COUNT(*) и OFFSET.
+
+    Каждая страница выбирается условием по индексу от позиции курсора,
+    поэтому глубокие страницы стоят столько же, сколько первая.
+
+    Элементами могут быть модели или словари из values() с ключом id.
+
+    Возвращает обычный Page: номера страниц относительные (1 для первой
+    страницы, 2 для остальных), а num_pages показывает, есть ли следующая.
+    Токены соседних страниц лежат в next_cursor и previous_cursor,
+    текущий токен в cursor.
+    '''
+
+    parse_value = staticmethod(parse_datetime)
+
+    def __init__(self, object_list, per_page, date_field='pub_date',
+                 descending=True, count=None):
+        self.date_field = date_field
+        self.descending = descending
+        self.known_count = count
+        super().__init__(object_list, per_page)
+
+    @cached_property
+    def count(self):
+        '''Общее количество: готовый счётчик или оценка базы данных'''
+        if self.known_count is not None:
+            return self.known_count
+        return estimate_count(self.object_list)
+
+    def _fetch(self, limit, position=None, reverse=False):
+        '''Первые limit объектов после позиции (дата, id) курсора'''
+        return list(keyset(
+            self.object_list, self.date_field,
+            self.descending != reverse, position
+        )[:limit])
+
+    def _key(self, obj):
+        if isinstance(obj, dict):
+            return obj[self.date_field], obj['id']
+        return getattr(obj, self.date_field), obj.pk
+
+    def first_page(self):
+        items = self._fetch(self.per_page + 1)
+        return self._build(items[:self.per_page],
+                           has_next=len(items) > self.per_page)
+
+    def page(self, cursor):
+        position = decode_cursor(cursor, self.parse_value)
+        if position is None:
+            return self.first_page()
+        direction, value, pk = position
+        if direction == FORWARD:
+            items = self._fetch(self.per_page + 1, (value, pk))
+            return self._build(items[:self.per_page], cursor=cursor,
+                               has_next=len(items) > self.per_page,
+                               has_previous=bool(items))
+        items = self._fetch(self.per_page + 1, (value, pk), reverse=True)
+        if len(items) <= self.per_page:
+            # Дошли до начала ленты: отдаём полную первую страницу.
+            return self.first_page()
+        items = items[:self.per_page][::-1]
+        return self._build(items, cursor=cursor, has_next=True,
+                           has_previous=True)
+
+    def get_page(self, cursor):
+        return self.page(cursor)
+
+    def _build(self, items, cursor=None, has_next=False,
+               has_previous=False):
+        has_next = has_next and bool(items)
+        has_previous = has_previous and bool(items)
+        number = 2 if has_previous else 1
+        self.num_pages = number + 1 if has_next else number
+        page = Page(items, number, self)
+        page.cursor = cursor
+        page.next_cursor = page.previous_cursor = None
+        if has_next:
+            page.next_cursor = encode_cursor(FORWARD, *self._key(items[-1]))
+        if has_previous:
+            page.previous_cursor = encode_cursor(
+                BACKWARD, *self._key(items[0])
+            )
+        return page
+
 
-def paginator_mod(lists, request):
-    paginator = Paginator(lists, AMT_POSTS)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+def paginator_mod(lists, request, count=None):
+    paginator = CursorPaginator(lists, AMT_POSTS, count=count)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
     return page_obj
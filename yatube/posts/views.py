@@ -1,68 +1,152 @@
 from django.contrib.auth.decorators import login_required
+from django.http import Http404, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 
+from core.decorators import anonymous_page_cache
+from yatube.settings import AMT_POSTS
+
+from . import comments, generations, page_state, thumbnails
+from .feed import FeedPaginator
 from .forms import PostForm, CommentForm
-from .models import Group, Post, Comment, Follow, User
-from .utils import paginator_mod
+from .search import SearchPaginator
+from .models import Comment, Group, Post, Follow, User
+from .uploads import add_upload_errors, image_uploads
+from .utils import author_stats, paginator_mod
 
 
+@anonymous_page_cache(page_state.index_state)
 def index(request):
     '''Главная страница сайта'''
-    page_obj = paginator_mod(Post.objects.select_related('group'), request)
+    page_obj = paginator_mod(Post.objects.for_listing(), request)
+    thumbnails.attach(page_obj, 'card')
     context = {
         'page_obj': page_obj,
+        'cache_version': generations.get_version('posts'),
     }
     return render(request, 'posts/index.html', context)
 
 
+@anonymous_page_cache(page_state.group_state)
 def group_posts(request, slug):
     '''Страница с группированными постами'''
     group = get_object_or_404(Group, slug=slug)
-    page_obj = paginator_mod(Post.objects.filter(group=group), request)
+    page_obj = paginator_mod(
+        Post.objects.for_listing().filter(group=group), request,
+        count=group.posts_count
+    )
+    thumbnails.attach(page_obj, 'card')
     context = {
         'group': group,
         'page_obj': page_obj,
+        'cache_version': generations.get_version(f'group:{group.pk}'),
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@anonymous_page_cache(page_state.profile_state)
 def profile(request, username):
     '''Страница всех постов пользователя'''
-    author = get_object_or_404(User, username=username)
-    page_obj = paginator_mod(Post.objects.filter(author=author), request)
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    stats = author_stats(author)
+    page_obj = paginator_mod(
+        Post.objects.for_listing().filter(author=author), request,
+        count=stats.posts_count
+    )
+    thumbnails.attach(page_obj, 'card')
     following = request.user.is_authenticated and Follow.objects.filter(
-        user__username=request.user, author=author).exists()
+        user=request.user, author=author).exists()
     context = {
         'page_obj': page_obj,
         'author': author,
+        'stats': stats,
         'following': following,
+        'cache_version': generations.get_version(f'author:{author.pk}'),
     }
     return render(request, 'posts/profile.html', context)
 
 
+@anonymous_page_cache(page_state.post_detail_state)
 def post_detail(request, post_id):
     '''Страница с информацией о посте'''
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(Post.objects.for_detail(), pk=post_id)
     group = post.group
     author = post.author
-    count_posts = author.posts.count
+    stats = author_stats(author)
     form = CommentForm(request.POST or None)
-    comments = Comment.objects.filter(post=post)
+    page_obj = comments.roots(post.pk)
     context = {
         'post': post,
         'group': group,
         'author': author,
-        'comments': comments,
-        'count_posts': count_posts,
+        'comments': page_obj,
+        'next_url': comments.next_url(post.pk, page_obj),
+        'stats': stats,
         'form': form,
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+@anonymous_page_cache(page_state.post_detail_state)
+def post_comments(request, post_id):
+    '''Следующая страница комментариев для подгрузки: HTML или JSON.
+
+    ?before= листает корневые комментарии, ?thread= отдаёт ответы
+    на комментарий, их следующие страницы - ?after=.
+    '''
+    post = get_object_or_404(Post.objects.only('id'), pk=post_id)
+    thread_id = request.GET.get('thread')
+    root = None
+    if thread_id is None:
+        page_obj = comments.roots(post.pk, request.GET.get('before'))
+    elif thread_id.isdigit():
+        root = get_object_or_404(
+            Comment.objects.only('id', 'post_id', 'path'),
+            pk=thread_id, post=post,
+        )
+        page_obj = comments.thread(root, request.GET.get('after'))
+    else:
+        raise Http404
+    next_url = comments.next_url(
+        post.pk, page_obj, root.pk if root else None
+    )
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'comments': [comments.serialize(item) for item in page_obj],
+            'next': next_url,
+        }, json_dumps_params={'ensure_ascii': False})
+    context = {
+        'comments': page_obj,
+        'next_url': next_url,
+        'thread': root,
+    }
+    return render(request, 'includes/comments.html', context)
+
+
+def search(request):
+    '''Поиск по тексту постов'''
+    query = request.GET.get('q', '').strip()
+    page_obj = None
+    if query:
+        paginator = SearchPaginator(
+            Post.objects.for_listing(), query, AMT_POSTS
+        )
+        page_obj = paginator.get_page(request.GET.get('cursor'))
+        thumbnails.attach(page_obj, 'card')
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
+@image_uploads
 def post_create(request):
     '''Страница создания нового поста'''
     form = PostForm(request.POST or None, files=request.FILES or None,)
+    add_upload_errors(form, request)
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
@@ -72,6 +156,7 @@ def post_create(request):
 
 
 @login_required
+@image_uploads
 def post_edit(request, post_id):
     '''Страница редактирования поста'''
     post = get_object_or_404(Post, pk=post_id)
@@ -80,10 +165,13 @@ def post_edit(request, post_id):
         files=request.FILES or None,
         instance=post
     )
+    add_upload_errors(form, request)
     if request.user != post.author:
         return redirect('posts:post_detail', post_id)
     if form.is_valid():
-        form.save()
+        # Только поля формы: счётчики, посчитанные с момента загрузки
+        # поста, и копии картинки пишут другие запросы и фоновые задачи
+        form.save(commit=False).save(update_fields=PostForm.Meta.fields)
         return redirect('posts:post_detail', post_id)
     return render(request, 'posts/create_post.html',
                   {'form': form, 'is_edit': True, 'post': post}
@@ -99,6 +187,11 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
+        parent_id = request.POST.get('parent', '')
+        if parent_id.isdigit():
+            comment.parent = Comment.objects.filter(
+                pk=parent_id, post=post
+            ).only('id', 'path').first()
         comment.save()
     return redirect('posts:post_detail', post_id=post_id)
 
@@ -106,10 +199,20 @@ def add_comment(request, post_id):
 @login_required
 def follow_index(request):
     '''Страница подписки на автора'''
-    posts = Post.objects.filter(
-        author__following__user=request.user).select_related('author', 'group')
-    page_obj = paginator_mod(posts, request)
-    return render(request, 'posts/follow.html', {'page_obj': page_obj})
+    paginator = FeedPaginator(
+        Post.objects.for_listing(),
+        request.user,
+        AMT_POSTS,
+    )
+    page_obj = paginator.get_page(request.GET.get('cursor'))
+    thumbnails.attach(page_obj, 'card')
+    context = {
+        'page_obj': page_obj,
+        'cache_version': generations.get_version(
+            'posts', f'feed:{request.user.pk}'
+        ),
+    }
+    return render(request, 'posts/follow.html', context)
 
 
 @login_required
@@ -29,6 +29,8 @@ INSTALLED_APPS = [
     'posts.apps.PostsConfig',
     'users.apps.UsersConfig',
     'about.apps.AboutConfig',
+    'api.apps.ApiConfig',
+    'jobs.apps.JobsConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -39,6 +41,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.RequestMetricsMiddleware',
+    'core.middleware.PrimaryStickyMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -68,6 +72,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'core.context_processors.year.year',
+                'core.context_processors.cache.fragment_cache',
             ],
         },
     },
@@ -79,13 +84,52 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# Сколько секунд держать соединение с базой между запросами: 0 - новое
+# соединение на каждый запрос. С gthread у каждого потока воркера своё
+# постоянное соединение, так что их не больше, чем потоков
+DB_CONN_MAX_AGE = int(os.getenv('DB_CONN_MAX_AGE', 60))
+# Перед каждым запросом проверять, что постоянные соединения живы
+DB_HEALTH_CHECKS = os.getenv('DB_HEALTH_CHECKS', '1') == '1'
+# PRAGMA для каждого нового соединения SQLite (core.db.configure_sqlite).
+# В WAL читатели не ждут писателя, а synchronous=NORMAL в WAL не теряет
+# данные при падении процесса - только последние транзакции при
+# отключении питания
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -64 * 1024,  # в КиБ, то есть 64 МиБ
+    'mmap_size': 256 * 1024 * 1024,
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': DB_CONN_MAX_AGE,
     }
 }
 
+# Реплики только для чтения: DATABASE_REPLICA_PATHS - файлы SQLite через
+# запятую, они становятся базами replica1, replica2, ... Для других СУБД
+# реплики описываются в DATABASES и перечисляются в DATABASE_REPLICAS.
+# Пишет приложение всегда в default, см. core.db.
+DATABASE_REPLICAS = []
+for number, path in enumerate(
+        filter(None, os.getenv('DATABASE_REPLICA_PATHS', '').split(',')), 1):
+    DATABASES[f'replica{number}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': path.strip(),
+        'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{number}')
+DATABASE_ROUTERS = ['core.db.PrimaryReplicaRouter']
+# Столько секунд после записи пользователь читает из основной базы,
+# пока реплики догоняют её
+PRIMARY_STICKY_SECONDS = int(os.getenv('PRIMARY_STICKY_SECONDS', 5))
+PRIMARY_STICKY_COOKIE = 'primary_sticky'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -124,19 +168,176 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/2.2/howto/static-files/
 
 STATIC_URL = '/static/'
+STATIC_ROOT = os.getenv('STATIC_ROOT', os.path.join(BASE_DIR, 'staticfiles'))
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Без DEBUG статика собирается с хэшем в имени и сжатыми копиями
+if not DEBUG:
+    STATICFILES_STORAGE = (
+        'core.storage.CompressedManifestStaticFilesStorage'
+    )
+STATIC_COMPRESS_EXTENSIONS = (
+    '.css', '.js', '.svg', '.txt', '.json', '.xml', '.map', '.ico',
+)
+# Файлы без хэша в имени кэшируются на это время, с хэшем - навсегда
+MEDIA_MAX_AGE = 60 * 60
+# Кто отдаёт тело файла: '' - Django, 'x-accel-redirect' - nginx,
+# 'x-sendfile' - Apache/lighttpd. Для nginx SENDFILE_URL должен быть
+# internal location, где лежат каталоги media/ и static/
+SENDFILE_BACKEND = os.getenv('SENDFILE_BACKEND', '')
+SENDFILE_URL = os.getenv('SENDFILE_URL', '/protected/')
+
 
 AMT_POSTS = 10  # Количество постов
+AMT_COMMENTS = 20  # Комментариев на странице ленты и ветки
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
-EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+EMAIL_BACKEND = os.getenv(
+    'EMAIL_BACKEND', 'django.core.mail.backends.filebased.EmailBackend'
+)
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
+TEST_RUNNER = 'core.testing.TestRunner'
+
+# Потоки для фоновых задач: миниатюры, копии картинок и раскладка
+# постов по лентам не задерживают ответ. 0 выполняет задачи в потоке
+# запроса после коммита, и загрузка картинки ждёт их. 0 задаётся через
+# окружение для отладки, тесты ставят его сами (core.testing.TestRunner,
+# tests/conftest.py): тестовая база в памяти не выдерживает записи
+# из других потоков
+BACKGROUND_WORKERS = int(os.getenv('BACKGROUND_WORKERS', 2))
+# 1 - фоновые задачи ставятся в очереди jobs и выполняются воркером
+# run_jobs, а не в потоках этого процесса
+BACKGROUND_JOBS = os.getenv('BACKGROUND_JOBS', '') == '1'
+# Очереди jobs: имя -> сколько задач очереди выполняется одновременно
+# на всех воркерах
+JOB_QUEUES = {'default': 4, 'images': 2, 'email': 1}
+# Очередь по пути задачи, остальные задачи идут в default
+JOB_ROUTES = {
+    'posts.thumbnails.generate': 'images',
+    'posts.images.release': 'images',
+}
+JOB_WORKER_PROCESSES = int(os.getenv('JOB_WORKER_PROCESSES', 4))
+JOB_MAX_ATTEMPTS = 5
+# Пауза перед первым повтором в секундах, дальше вдвое больше
+JOB_RETRY_DELAY = 10
+JOB_RETRY_MAX_DELAY = 60 * 60
+# Задачу упавшего воркера другой воркер заберёт через столько секунд
+JOB_LEASE_SECONDS = 5 * 60
+# Очередь и настоящий бэкенд для EMAIL_BACKEND = jobs.mail.QueuedEmailBackend
+JOB_EMAIL_QUEUE = 'email'
+JOB_EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+# Посты авторов с таким числом подписчиков не раскладываются по лентам,
+# а подтягиваются в ленту при чтении
+FEED_PULL_THRESHOLD = 10000
+# Сколько последних постов автора добавить в ленту при подписке
+FEED_BACKFILL_SIZE = 1000
+# Ответы глубже этого уровня прикрепляются к предку на последнем уровне
+COMMENT_MAX_DEPTH = 8
+# Загрузки больше IMAGE_MAX_PIXELS отклоняются, стороны больше
+# IMAGE_MAX_SIDE уменьшаются при сохранении
+IMAGE_MAX_PIXELS = 40_000_000
+# Загрузки больше этого размера обрываются, не дочитывая тело запроса
+IMAGE_MAX_UPLOAD_SIZE = 20 * 1024 * 1024
+IMAGE_MAX_SIDE = 2560
+# Файл картинки, сохранённый за столько секунд до удаления поста или
+# позже, не удаляется: его может ждать пост из параллельной загрузки
+IMAGE_RELEASE_GRACE = 60
+# Ширины копий для srcset и форматы в порядке предпочтения; берётся
+# первый, который поддерживает установленный Pillow
+IMAGE_VARIANT_WIDTHS = (480, 960, 1920)
+IMAGE_VARIANT_FORMATS = ('AVIF', 'WEBP', 'JPEG')
+# Миниатюры картинок постов, которые готовятся заранее в фоне:
+# имя -> (геометрия, опции sorl-thumbnail)
+THUMBNAIL_RENDITIONS = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
+}
 
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+# Метрики запросов: Server-Timing, лог yatube.requests и бюджеты
+# по имени представления
+REQUEST_METRICS = {
+    'ENABLED': os.getenv('REQUEST_METRICS', '') == '1',
+    'DEFAULT_BUDGET': {'queries': 20, 'sql_ms': 200},
+    'BUDGETS': {
+        'posts:index': {'queries': 5},
+        'posts:group_list': {'queries': 6},
+        'posts:profile': {'queries': 7},
+        'posts:post_detail': {'queries': 6},
+        'posts:follow_index': {'queries': 7},
+    },
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'yatube.requests': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
+# Кэш выбирается окружением: CACHE_BACKEND = locmem | file | memcached |
+# redis, CACHE_LOCATION = каталог или адрес сервера. Общий для воркеров
+# кэш прикрывается локальным LRU (core.cache.TwoTierCache), если
+# CACHE_LOCAL_TIMEOUT больше нуля. Клиенты серверов кэша не входят
+# в requirements.txt и ставятся отдельно: для memcached -
+# python-memcached==1.59, для redis - django-redis==4.12.1.
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'memcached': 'django.core.cache.backends.memcached.MemcachedCache',
+    'redis': 'django_redis.cache.RedisCache',
+}
+CACHE_DEFAULT_LOCATIONS = {
+    'locmem': '',
+    'file': os.path.join(BASE_DIR, 'cache'),
+    'memcached': '127.0.0.1:11211',
+    'redis': 'redis://127.0.0.1:6379/1',
 }
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'locmem')
+CACHE_LOCAL_TIMEOUT = int(os.getenv('CACHE_LOCAL_TIMEOUT', 2))
+
+SHARED_CACHE = {
+    'BACKEND': CACHE_BACKENDS[CACHE_BACKEND],
+    'LOCATION': os.getenv(
+        'CACHE_LOCATION', CACHE_DEFAULT_LOCATIONS[CACHE_BACKEND]
+    ),
+}
+
+if CACHE_BACKEND == 'locmem' or not CACHE_LOCAL_TIMEOUT:
+    CACHES = {
+        'default': SHARED_CACHE,
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache.TwoTierCache',
+            'OPTIONS': {
+                'SHARED': 'shared',
+                'LOCAL_TIMEOUT': CACHE_LOCAL_TIMEOUT,
+                'LOCAL_MAX_ENTRIES': 500,
+            },
+        },
+        'shared': SHARED_CACHE,
+    }
+
+# Фрагменты страниц и целые страницы для анонимов сбрасываются сменой
+# поколения (posts.generations), поэтому в общем кэше время жизни
+# ограничивает только его объём. locmem у каждого процесса свой:
+# поколение, сдвинутое в одном воркере gunicorn, другие не видят,
+# и свежесть там держится только коротким временем жизни
+if CACHE_BACKEND == 'locmem':
+    FRAGMENT_CACHE_TIMEOUT = 20
+    ANONYMOUS_PAGE_CACHE_TIMEOUT = 20
+else:
+    FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 3
+    ANONYMOUS_PAGE_CACHE_TIMEOUT = 60 * 60